@@ -0,0 +1,77 @@
+"""Embedding throughput over transcript chunks across batch sizes and thread counts.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embeddings --backend onnx --batch-sizes 8,32,64 --threads 1,2,4
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import RagConfig
+from rag.chunking import chunk_pages
+from rag.embeddings import create_embedding_engine
+from rag.extraction import iter_pdf_pages
+
+TRANSCRIPT_DIR = os.path.join(os.path.dirname(__file__), '..', 'transcripts')
+
+
+def load_chunks(transcripts, limit):
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(transcripts, '*', '*.pdf'))):
+        pages = ((page_no, text) for _, page_no, text in iter_pdf_pages(path))
+        chunks.extend(chunk['text'] for chunk in chunk_pages(pages, RagConfig.CHUNK_SIZE, RagConfig.CHUNK_OVERLAP))
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', default=RagConfig.EMBEDDING_BACKEND)
+    parser.add_argument('--batch-sizes', type=int_list, default=[8, 32, 64])
+    parser.add_argument('--threads', type=int_list, default=[1, os.cpu_count() or 1])
+    parser.add_argument('--chunks', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=50, help="Single-query latency samples")
+    parser.add_argument('--transcripts', default=TRANSCRIPT_DIR)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.transcripts, args.chunks)
+    print(f"{len(chunks)} chunks, backend '{args.backend}'")
+    print(f"{'threads':>8} {'batch':>6} {'seconds':>9} {'emb/sec':>9} {'query p50 ms':>13} {'p99 ms':>8}")
+
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            config = type('BenchConfig', (RagConfig,), {
+                'EMBEDDING_BACKEND': args.backend,
+                'EMBEDDING_BATCH_SIZE': batch_size,
+                'EMBEDDING_THREADS': threads
+            })
+            engine = create_embedding_engine(config)
+            engine(["warm-up"])
+
+            start = time.perf_counter()
+            engine(chunks)
+            elapsed = time.perf_counter() - start
+
+            latencies = []
+            for i in range(args.queries):
+                query_start = time.perf_counter()
+                engine([f"what is covered in week {i % 12 + 1}?"])
+                latencies.append((time.perf_counter() - query_start) * 1000)
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{threads:>8} {batch_size:>6} {elapsed:>9.2f} {len(chunks) / elapsed:>9.1f} "
+                  f"{statistics.median(latencies):>13.1f} {p99:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
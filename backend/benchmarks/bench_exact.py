@@ -0,0 +1,93 @@
+"""Exact (quantized, memory-mapped) search vs Chroma HNSW at several corpus sizes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_exact --sizes 1000,10000,100000
+    python -m benchmarks.bench_exact --sizes 10000 --dtypes int8 --queries 500
+
+Vectors are synthetic clustered unit vectors (see ``sweep_hnsw``). Recall@k
+is measured against float32 brute force; memory is the exact index's matrix
+size vs the Chroma directory on disk.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_embeddings import int_list
+from benchmarks.sweep_hnsw import exact_top_k, load_vectors
+from config import RagConfig
+from rag.exact_index import ExactIndex
+from rag.maintenance import directory_size
+
+
+def measure(search, queries, truth, k):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(map(int, found)) & set(expected.tolist()))
+    return hits / (len(queries) * k), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int_list, default=[1000, 10000, 100000])
+    parser.add_argument('--dtypes', default='int8,float16')
+    parser.add_argument('--k', type=int, default=RagConfig.RETRIEVAL_CANDIDATES)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'vectors':>8} {'engine':>13} {'build s':>8} {'recall@k':>9} {'p50 ms':>7} {'p99 ms':>7} {'MB':>7}")
+    for size in args.sizes:
+        vectors = load_vectors(size, args.dim, args.seed)
+        rng = np.random.default_rng(args.seed)
+        queries = vectors[rng.integers(len(vectors), size=args.queries)]
+        queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        k = min(args.k, size)
+        truth = exact_top_k(vectors, queries, k, 'cosine')
+        ids = [str(i) for i in range(size)]
+
+        directory = tempfile.mkdtemp(prefix='bench-exact-')
+        try:
+            client = chromadb.PersistentClient(path=directory)
+            collection = client.create_collection('bench', embedding_function=None, metadata={
+                "hnsw:space": "cosine", "hnsw:M": RagConfig.HNSW_M,
+                "hnsw:construction_ef": RagConfig.HNSW_CONSTRUCTION_EF, "hnsw:search_ef": RagConfig.HNSW_SEARCH_EF
+            })
+            start = time.perf_counter()
+            batch = client.get_max_batch_size()
+            for offset in range(0, size, batch):
+                collection.add(ids=ids[offset:offset + batch], embeddings=vectors[offset:offset + batch])
+            build_seconds = time.perf_counter() - start
+            recall, p50, p99 = measure(
+                lambda q: collection.query(query_embeddings=[q], n_results=k, include=[])['ids'][0],
+                queries, truth, k)
+            size_mb = directory_size(directory) / 2 ** 20
+            print(f"{size:>8} {'hnsw':>13} {build_seconds:>8.2f} {recall:>9.3f} {p50:>7.2f} {p99:>7.2f} {size_mb:>7.1f}")
+
+            for dtype in args.dtypes.split(','):
+                path = os.path.join(directory, f'bench.{dtype}.exact.bin')
+                start = time.perf_counter()
+                ExactIndex.build(ids, [''] * size, vectors, dtype).save(path)
+                build_seconds = time.perf_counter() - start
+                index = ExactIndex.load(path)
+                recall, p50, p99 = measure(lambda q: index.search(q, k)[0], queries, truth, k)
+                print(f"{size:>8} {'exact-' + dtype:>13} {build_seconds:>8.2f} {recall:>9.3f} "
+                      f"{p50:>7.2f} {p99:>7.2f} {index.nbytes / 2 ** 20:>7.1f}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
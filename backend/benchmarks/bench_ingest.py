@@ -0,0 +1,39 @@
+"""Extraction throughput over the bundled transcripts at 1..N workers.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingest --max-workers 4
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rag.extraction import count_pdf_pages, extract_texts
+
+TRANSCRIPT_DIR = os.path.join(os.path.dirname(__file__), '..', 'transcripts')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--pages-per-task', type=int, default=16)
+    parser.add_argument('--transcripts', default=TRANSCRIPT_DIR)
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.transcripts, '*', '*.pdf')))
+    total_pages = sum(count_pdf_pages(path) for path in pdf_paths)
+    print(f"{len(pdf_paths)} PDFs, {total_pages} pages")
+    print(f"{'workers':>8} {'seconds':>9} {'pages/sec':>10} {'errors':>7}")
+
+    for workers in range(1, args.max_workers + 1):
+        start = time.perf_counter()
+        errors = sum(1 for _, _, error in extract_texts(pdf_paths, workers, args.pages_per_task) if error)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>8} {elapsed:>9.2f} {total_pages / elapsed:>10.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Recall@k of PCA / random-projection reduced embeddings vs dimension.
+
+Usage (from backend/):
+    python -m benchmarks.bench_projection --dims 32,64,128,192 --methods pca,random
+    python -m benchmarks.bench_projection --synthetic 20000   # no embedding model needed
+
+Chunks come from the transcripts and are embedded with the configured
+engine. Queries are the opening words of randomly picked chunks, like a
+student quoting the lecture. The projection is fitted on the chunks (as
+``ingest.py`` does) and recall@k is measured against full-width exact
+search, in the configured HNSW space.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_embeddings import TRANSCRIPT_DIR, int_list, load_chunks
+from benchmarks.sweep_hnsw import exact_top_k, load_vectors
+from config import RagConfig
+from rag.embeddings import create_embedding_engine
+from rag.projection import fit_projection
+
+
+def load_corpus(args, rng):
+    if args.synthetic:
+        vectors = load_vectors(args.synthetic, args.dim, args.seed)
+        queries = vectors[rng.integers(len(vectors), size=args.queries)]
+        queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+        return vectors, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    chunks = load_chunks(args.transcripts, args.chunks)
+    if not chunks:
+        sys.exit(f"No transcript chunks found in {args.transcripts}; use --synthetic")
+    engine = create_embedding_engine(RagConfig)
+    picked = rng.integers(len(chunks), size=args.queries)
+    questions = [" ".join(chunks[i].split()[:12]) for i in picked]
+    return np.asarray(engine(chunks), dtype=np.float32), np.asarray(engine(questions), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dims', type=int_list, default=[32, 64, 128, 192])
+    parser.add_argument('--methods', default='pca,random')
+    parser.add_argument('--space', default=RagConfig.HNSW_SPACE)
+    parser.add_argument('--k', type=int, default=RagConfig.RETRIEVAL_CANDIDATES)
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--transcripts', default=TRANSCRIPT_DIR)
+    parser.add_argument('--synthetic', type=int, default=0, help="use N synthetic vectors instead of the transcripts")
+    parser.add_argument('--dim', type=int, default=384, help="dimension of synthetic vectors")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors, queries = load_corpus(args, rng)
+    k = min(args.k, len(vectors))
+    truth = exact_top_k(vectors, queries, k, args.space)
+
+    print(f"{len(vectors)} chunks x {vectors.shape[1]} dims, {len(queries)} queries, k={k}, space={args.space}")
+    print(f"{'method':>7} {'dims':>5} {'fit s':>6} {'recall@k':>9} {'bytes/vec':>10} {'size':>6}")
+    print(f"{'full':>7} {vectors.shape[1]:>5} {0:>6.2f} {1:>9.3f} {4 * vectors.shape[1]:>10} {1:>6.2f}")
+    for method in args.methods.split(','):
+        for dim in args.dims:
+            if dim > vectors.shape[1] or (method == 'pca' and dim > len(vectors)):
+                continue
+            start = time.perf_counter()
+            projection = fit_projection(vectors, dim, method, args.seed)
+            fit_seconds = time.perf_counter() - start
+            found = exact_top_k(projection.transform(vectors), projection.transform(queries), k, args.space)
+            hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(found, truth))
+            print(f"{method:>7} {dim:>5} {fit_seconds:>6.2f} {hits / (len(queries) * k):>9.3f} "
+                  f"{4 * dim:>10} {dim / vectors.shape[1]:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
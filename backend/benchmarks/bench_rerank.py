@@ -0,0 +1,56 @@
+"""Cross-encoder rerank latency vs. candidate count on CPU.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rerank --candidates 5,10,20,40 --threads 1,2
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_embeddings import TRANSCRIPT_DIR, int_list, load_chunks
+from config import RagConfig
+from rag.rerank import CrossEncoderScorer
+
+QUERIES = [
+    "What is boundary value analysis?",
+    "How does mutation testing measure test quality?",
+    "Explain cyclomatic complexity",
+    "What are user stories in agile?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=RagConfig.RERANK_MODEL_PATH or RagConfig.RERANK_MODEL)
+    parser.add_argument('--candidates', type=int_list, default=[5, 10, 20, 40])
+    parser.add_argument('--threads', type=int_list, default=[1, os.cpu_count() or 1])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--transcripts', default=TRANSCRIPT_DIR)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.transcripts, max(args.candidates))
+    print(f"{len(chunks)} chunks, model '{args.model}', budget {RagConfig.RERANK_BUDGET_MS} ms")
+    print(f"{'threads':>8} {'k':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'over budget':>12}")
+
+    for threads in args.threads:
+        scorer = CrossEncoderScorer(args.model, max_length=RagConfig.RERANK_MAX_LENGTH, threads=threads)
+        scorer.score("warm-up", ["warm-up"])
+        for k in args.candidates:
+            latencies = []
+            for i in range(args.repeats):
+                start = time.perf_counter()
+                scorer.score(QUERIES[i % len(QUERIES)], chunks[:k])
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies = np.array(latencies)
+            over = int((latencies > RagConfig.RERANK_BUDGET_MS).sum())
+            print(f"{threads:>8} {k:>5} {np.percentile(latencies, 50):>8.1f} {np.percentile(latencies, 95):>8.1f} "
+                  f"{latencies.max():>8.1f} {over:>12}")
+
+
+if __name__ == "__main__":
+    main()
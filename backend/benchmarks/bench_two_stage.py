@@ -0,0 +1,90 @@
+"""Two-stage (document, then chunk) retrieval vs flat search as the corpus grows.
+
+Usage (from backend/):
+    python -m benchmarks.bench_two_stage --documents 50,200,1000 --chunks-per-document 80
+    python -m benchmarks.bench_two_stage --documents 200 --top-documents 3,5,10 --hnsw
+
+Each synthetic document is a cluster of chunk vectors around its own
+topic, like one lecture PDF. Queries are perturbed chunks. Recall@k is
+measured against float32 brute force over every chunk; ``--hnsw`` adds
+Chroma's flat HNSW search to the comparison.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import chromadb
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_embeddings import int_list
+from benchmarks.bench_exact import measure
+from benchmarks.sweep_hnsw import exact_top_k
+from config import RagConfig
+from rag.documents import DocumentIndex
+from rag.exact_index import ExactIndex
+
+
+def synthetic_documents(documents, chunks_per_document, dim, rng):
+    topics = rng.normal(size=(documents, dim))
+    vectors = np.repeat(topics, chunks_per_document, axis=0) + 0.8 * rng.normal(size=(documents * chunks_per_document, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    metadatas = [{'folder': 'st', 'source': f'lecture{d}.pdf'} for d in range(documents) for _ in range(chunks_per_document)]
+    return vectors, metadatas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int_list, default=[50, 200, 1000])
+    parser.add_argument('--chunks-per-document', type=int, default=80)
+    parser.add_argument('--top-documents', type=int_list, default=[RagConfig.TWO_STAGE_DOCUMENTS])
+    parser.add_argument('--dtype', default=RagConfig.EXACT_INDEX_DTYPE)
+    parser.add_argument('--hnsw', action='store_true', help="also time Chroma's flat HNSW search")
+    parser.add_argument('--k', type=int, default=RagConfig.RETRIEVAL_CANDIDATES)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'docs':>6} {'chunks':>8} {'search':>14} {'recall@k':>9} {'p50 ms':>7} {'p99 ms':>7}")
+    for documents in args.documents:
+        rng = np.random.default_rng(args.seed)
+        vectors, metadatas = synthetic_documents(documents, args.chunks_per_document, args.dim, rng)
+        queries = vectors[rng.integers(len(vectors), size=args.queries)]
+        queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        k = min(args.k, len(vectors))
+        truth = exact_top_k(vectors, queries, k, 'cosine')
+        ids = [str(i) for i in range(len(vectors))]
+
+        def report(name, search):
+            recall, p50, p99 = measure(search, queries, truth, k)
+            print(f"{documents:>6} {len(vectors):>8} {name:>14} {recall:>9.3f} {p50:>7.2f} {p99:>7.2f}")
+
+        flat = ExactIndex.build(ids, ['st'] * len(ids), vectors, args.dtype)
+        report('flat exact', lambda q: [flat.ids[row] for row in flat.search(q, k)[0]])
+        index = DocumentIndex.build(ids, metadatas, vectors, args.dtype)
+        for top_documents in args.top_documents:
+            index.top_documents = top_documents
+            report(f'two-stage@{top_documents}', lambda q: [index.ids[row] for row in index.search(q, k)[0]])
+
+        if args.hnsw:
+            directory = tempfile.mkdtemp(prefix='bench-two-stage-')
+            try:
+                client = chromadb.PersistentClient(path=directory)
+                collection = client.create_collection('bench', embedding_function=None,
+                                                      metadata={"hnsw:space": "cosine"})
+                batch = client.get_max_batch_size()
+                for offset in range(0, len(ids), batch):
+                    collection.add(ids=ids[offset:offset + batch], embeddings=vectors[offset:offset + batch])
+                report('flat hnsw', lambda q: collection.query(query_embeddings=[q], n_results=k,
+                                                               include=[])['ids'][0])
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""HNSW parameter sweep: recall@k against exact search, query latency and disk size.
+
+Usage (from backend/):
+    python -m benchmarks.sweep_hnsw --m 8,16,32 --construction-ef 100,200 --search-ef 10,50,100
+    python -m benchmarks.sweep_hnsw --synthetic 20000     # project a larger corpus
+
+By default the vectors come from the ingested collection, so run
+``python ingest.py`` first. Each setting is built in a scratch directory.
+"""
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_embeddings import int_list
+from config import RagConfig
+from rag.maintenance import directory_size
+from rag.store import open_collection
+
+
+def load_vectors(synthetic, dim, seed):
+    if synthetic:
+        # Clustered unit vectors: closer to real chunk embeddings than uniform noise
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(size=(max(1, synthetic // 50), dim))
+        vectors = centers[rng.integers(len(centers), size=synthetic)] + 0.5 * rng.normal(size=(synthetic, dim))
+    else:
+        collection = open_collection()
+        vectors = np.asarray(collection.get(include=['embeddings'])['embeddings'])
+        if not len(vectors):
+            sys.exit(f"Collection '{collection.name}' is empty; run `python ingest.py` or use --synthetic")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, queries, k, space):
+    if space == 'l2':
+        scores = -(np.sum(queries ** 2, axis=1)[:, None] - 2 * queries @ vectors.T + np.sum(vectors ** 2, axis=1)[None, :])
+    else:
+        # Vectors are unit length, so cosine and inner product rank identically
+        scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--m', type=int_list, default=[8, 16, 32])
+    parser.add_argument('--construction-ef', type=int_list, default=[100, 200])
+    parser.add_argument('--search-ef', type=int_list, default=[10, 50, 100])
+    parser.add_argument('--space', default=RagConfig.HNSW_SPACE)
+    parser.add_argument('--k', type=int, default=RagConfig.RETRIEVAL_CANDIDATES)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--synthetic', type=int, default=0, help="use N synthetic vectors instead of the collection")
+    parser.add_argument('--dim', type=int, default=384, help="dimension of synthetic vectors")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.synthetic, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed)
+    # Queries near (not equal to) stored chunks, like paraphrased questions
+    queries = vectors[rng.integers(len(vectors), size=args.queries)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    k = min(args.k, len(vectors))
+    truth = exact_top_k(vectors, queries, k, args.space)
+    ids = [str(i) for i in range(len(vectors))]
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={k}, space={args.space}")
+    print(f"{'M':>4} {'ef_c':>5} {'ef_s':>5} {'build s':>8} {'recall@k':>9} {'p50 ms':>7} {'p99 ms':>7} {'disk MB':>8}")
+
+    for m, construction_ef in itertools.product(args.m, args.construction_ef):
+        for search_ef in args.search_ef:
+            directory = tempfile.mkdtemp(prefix='hnsw-sweep-')
+            try:
+                client = chromadb.PersistentClient(path=directory)
+                collection = client.create_collection('sweep', embedding_function=None, metadata={
+                    "hnsw:space": args.space, "hnsw:M": m,
+                    "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef
+                })
+                start = time.perf_counter()
+                batch = client.get_max_batch_size()
+                for offset in range(0, len(vectors), batch):
+                    collection.add(ids=ids[offset:offset + batch], embeddings=vectors[offset:offset + batch])
+                build_seconds = time.perf_counter() - start
+
+                latencies, hits = [], 0
+                for query, expected in zip(queries, truth):
+                    query_start = time.perf_counter()
+                    found = collection.query(query_embeddings=[query], n_results=k, include=[])['ids'][0]
+                    latencies.append((time.perf_counter() - query_start) * 1000)
+                    hits += len(set(map(int, found)) & set(expected.tolist()))
+                recall = hits / (len(queries) * k)
+                size_mb = directory_size(directory) / 2 ** 20
+                print(f"{m:>4} {construction_ef:>5} {search_ef:>5} {build_seconds:>8.2f} {recall:>9.3f} "
+                      f"{np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 99):>7.2f} {size_mb:>8.1f}")
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import os
+
 class Config: #all the same setting from init.py
     SECRET_KEY = 'SCT12025'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///database.db'
@@ -10,4 +12,70 @@ class Config: #all the same setting from init.py
     REMEMBER_COOKIE_DURATION = 3600  # Keeps session for 1 hour
     REMEMBER_COOKIE_SECURE = 'True'
     SESSION_COOKIE_NAME = 'session'
-    REMEMBER_COOKIE_NAME = 'remember_token'
\ No newline at end of file
+    REMEMBER_COOKIE_NAME = 'remember_token'
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_UPLOAD_MB', '50')) * 1024 * 1024  # Larger requests get a 413
+
+
+class RagConfig: # settings for transcript ingestion and retrieval
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    PERSIST_DIRECTORY = os.getenv('VECTORDB_DIR', os.path.join(BASE_DIR, 'vectordb'))
+    TRANSCRIPT_DIR = os.getenv('TRANSCRIPT_DIR', os.path.join(BASE_DIR, 'transcripts'))
+    COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'pdf_embeddings')
+    COURSE_PREFIXES = ['st', 'se']  # Sub-folders of TRANSCRIPT_DIR, stored as the `folder` metadata
+    COURSE_FOLDERS = {'software testing': 'st', 'software engineering': 'se'}  # Course names (as in the chat URL) -> folder
+    SHARD_BY_COURSE = os.getenv('SHARD_BY_COURSE', 'false').lower() == 'true'  # One collection per course: COLLECTION_NAME_<prefix>
+    SHARD_QUERY_WORKERS = int(os.getenv('SHARD_QUERY_WORKERS', '4'))  # Shards searched at once for cross-course questions
+    TEXT_STORE_DIR = os.getenv('TEXT_STORE_DIR', os.path.join(PERSIST_DIRECTORY, 'textstore'))  # Empty disables it
+    VECTOR_ENGINE = os.getenv('VECTOR_ENGINE', 'hnsw')  # 'hnsw' (Chroma) or 'exact' (quantized brute force)
+    EXACT_INDEX_DTYPE = os.getenv('EXACT_INDEX_DTYPE', 'int8')  # 'int8' or 'float16'
+    TWO_STAGE_RETRIEVAL = os.getenv('TWO_STAGE_RETRIEVAL', 'false').lower() == 'true'  # Pick the closest PDFs first, then search their chunks
+    TWO_STAGE_DOCUMENTS = int(os.getenv('TWO_STAGE_DOCUMENTS', '5'))  # PDFs whose chunks are searched per query
+    HNSW_SPACE = os.getenv('HNSW_SPACE', 'l2')  # Distance: 'l2', 'cosine' or 'ip'
+    HNSW_M = int(os.getenv('HNSW_M', '16'))  # Graph links per node; more = better recall, bigger index
+    HNSW_CONSTRUCTION_EF = int(os.getenv('HNSW_CONSTRUCTION_EF', '100'))  # Build-time candidate list size
+    HNSW_SEARCH_EF = int(os.getenv('HNSW_SEARCH_EF', '10'))  # Query-time candidate list size
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'default')  # 'default' (Chroma's), 'onnx' or 'sentence-transformers'
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    EMBEDDING_MODEL_PATH = os.getenv('EMBEDDING_MODEL_PATH', os.path.join(BASE_DIR, 'models', 'all-MiniLM-L6-v2'))  # Bundled model, used when present
+    EMBEDDING_OFFLINE = os.getenv('EMBEDDING_OFFLINE', 'false').lower() == 'true'  # Never download a model
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+    EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))  # Intra-op threads; 0 = library default
+    EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv('EMBEDDING_MAX_SEQ_LENGTH', '256'))  # Tokens; longer chunks are truncated
+    EMBEDDING_REDUCTION = os.getenv('EMBEDDING_REDUCTION', 'none')  # 'none', 'pca' or 'random'; fitted by ingest.py
+    EMBEDDING_REDUCED_DIM = int(os.getenv('EMBEDDING_REDUCED_DIM', '128'))  # Dimensions kept after the projection
+    EMBEDDING_REDUCTION_SAMPLE = int(os.getenv('EMBEDDING_REDUCTION_SAMPLE', '2000'))  # Chunks the PCA is fitted on
+    EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', os.path.join(PERSIST_DIRECTORY, 'embedding_cache'))  # Empty disables it
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '1'))  # 1 keeps extraction in-process
+    PAGES_PER_TASK = int(os.getenv('INGEST_PAGES_PER_TASK', '16'))  # Larger PDFs are split into page ranges
+    CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '1000'))  # Characters per chunk
+    CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '200'))  # Characters shared by neighbouring chunks
+    WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '64'))  # Chunks per upsert/embedding batch
+    WRITE_BATCH_BYTES = int(os.getenv('WRITE_BATCH_BYTES', str(512 * 1024)))  # Upper bound on text per batch
+    WRITE_MAX_RETRIES = int(os.getenv('WRITE_MAX_RETRIES', '3'))
+    REBUILD_SMOKE_QUERIES = [q for q in os.getenv('REBUILD_SMOKE_QUERIES', 'what is covered in this lecture?').split('|') if q]  # '|'-separated; each must hit every course
+    REBUILD_SMOKE_SAMPLES = int(os.getenv('REBUILD_SMOKE_SAMPLES', '5'))  # Chunks that must retrieve themselves
+    REBUILD_MIN_RATIO = float(os.getenv('REBUILD_MIN_RATIO', '0.5'))  # New version needs this share of the live chunk count
+    KEEP_COLLECTION_VERSIONS = int(os.getenv('KEEP_COLLECTION_VERSIONS', '2'))  # Versions kept after a swap, the live one included
+    INGEST_JOB_WORKERS = int(os.getenv('INGEST_JOB_WORKERS', '1'))  # Background ingestion jobs run at once
+    RETRIEVAL_CANDIDATES = int(os.getenv('RETRIEVAL_CANDIDATES', '20'))  # Chunks fetched before MMR
+    MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.5'))  # 1 = relevance only, 0 = diversity only
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))  # Upper bound on retrieved context in the prompt
+    LEXICAL_SEARCH = os.getenv('LEXICAL_SEARCH', 'true').lower() == 'true'  # Fuse BM25 keyword matches with the vector search
+    BM25_K1 = float(os.getenv('BM25_K1', '1.2'))
+    BM25_B = float(os.getenv('BM25_B', '0.75'))
+    RRF_K = int(os.getenv('RRF_K', '60'))  # Reciprocal-rank fusion constant
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'  # Reuse first-turn answers to near-identical questions
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))  # Cosine similarity needed for a hit
+    ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', '3600'))  # Seconds
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '1000'))  # Answers kept across all courses
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'  # Cross-encoder rerank of the retrieved candidates
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_MODEL_PATH = os.getenv('RERANK_MODEL_PATH', '')  # Local model directory; '' uses RERANK_MODEL
+    RERANK_MAX_LENGTH = int(os.getenv('RERANK_MAX_LENGTH', '256'))  # Tokens per (query, chunk) pair
+    RERANK_BUDGET_MS = int(os.getenv('RERANK_BUDGET_MS', '300'))  # Past this the vector order is used
+    QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))  # Entries per cache (query embeddings, result ids); 0 disables
+    QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', '600'))  # Seconds
+    WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'true').lower() == 'true'  # Load the model and run a dummy query before reporting ready
+    WATCH_TRANSCRIPTS = os.getenv('WATCH_TRANSCRIPTS', 'false').lower() == 'true'  # Re-index on file changes while serving
+    WATCH_DEBOUNCE_MS = int(os.getenv('WATCH_DEBOUNCE_MS', '5000'))  # Longest a burst of changes is held back
+    WATCH_QUIET_MS = int(os.getenv('WATCH_QUIET_MS', '1000'))  # Quiet period that ends a burst
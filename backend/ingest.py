@@ -0,0 +1,211 @@
+"""Build or update the transcript vector store.
+
+Run this before starting the API; run.py only opens the collection this
+produces. A running API keeps searching the HNSW index it loaded: Chroma
+doesn't show it vectors that another process adds or deletes in a
+collection it already has open. So while the API is up, use
+``--mode rebuild`` (which swaps in a new collection the API opens fresh),
+restart the API after ingesting, or let the API ingest itself
+(WATCH_TRANSCRIPTS or ``POST /v1/ingest/jobs``).
+
+Usage (from backend/):
+    python ingest.py                          # incremental sync of every course folder
+    python ingest.py --prefix st              # only transcripts/st
+    python ingest.py --prefix se --mode full  # drop and rebuild one course
+    python ingest.py --folder /data/new-course:nc --workers 4
+    python ingest.py --watch                  # keep syncing as PDFs change
+    python ingest.py --mode rebuild           # blue/green rebuild, then swap the alias
+
+With SHARD_BY_COURSE=true every course prefix gets its own collection, so
+``--prefix se --mode full`` leaves the other courses' shards untouched.
+
+With EMBEDDING_REDUCTION=pca (or random) the first run fits a projection
+on a sample of the chunks and every stored vector is reduced with it.
+Enable it on an empty store; to refit, delete
+``<COLLECTION_NAME>.projection.npz`` and re-ingest every course with
+``--mode full``.
+
+``--mode rebuild`` builds a new collection version (``<name>__v<N>``) while
+the current one keeps serving, smoke-tests it, atomically points the
+``<name>.alias.json`` alias at it and deletes versions older than
+KEEP_COLLECTION_VERSIONS. Use it after changing the chunker or embedding
+model. Without SHARD_BY_COURSE every course shares one collection, so a
+rebuild ingests all course folders whatever ``--prefix`` says.
+
+--watch is meant for a dedicated ingest box with no API running against
+the same store. To have a running API pick up new material, start it with
+WATCH_TRANSCRIPTS=true instead; its watcher feeds the in-process
+ingestion job queue.
+"""
+import argparse
+import os
+import random
+import sys
+
+from config import RagConfig
+from rag.chunking import chunk_pages
+from rag.embedding_cache import EmbeddingCache
+from rag.embeddings import create_embedding_engine
+from rag.extraction import iter_pdf_pages
+from rag.generation import index_changed
+from rag.projection import fit_projection, projection_path_for
+from rag.rebuild import blue_green_rebuild
+from rag.shards import ShardRouter
+from rag.store import get_embedding_function, open_collection, stored_vector_widths
+from rag.sync import config_options, derived_index_paths, publish_index_changes, reset_folder, sync_folder
+from rag.watcher import TranscriptWatcher
+
+
+def parse_folder(value):
+    folder, sep, prefix = value.rpartition(':')
+    if not sep or not folder or not prefix:
+        raise argparse.ArgumentTypeError(f"expected PATH:PREFIX, got '{value}'")
+    return folder, prefix
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the transcript vector store.")
+    parser.add_argument('--prefix', action='append', default=[],
+                        help=f"course sub-folder of {RagConfig.TRANSCRIPT_DIR} to ingest (repeatable; default: all of {RagConfig.COURSE_PREFIXES})")
+    parser.add_argument('--folder', action='append', default=[], type=parse_folder,
+                        help="ingest an arbitrary folder as PATH:PREFIX (repeatable)")
+    parser.add_argument('--mode', choices=['incremental', 'full', 'rebuild'], default='incremental',
+                        help="'full' drops everything under each prefix before re-ingesting; "
+                             "'rebuild' builds a new collection version and swaps it in")
+    parser.add_argument('--workers', type=int, default=RagConfig.INGEST_WORKERS,
+                        help="extraction processes (default: %(default)s)")
+    parser.add_argument('--watch', action='store_true',
+                        help=f"after syncing, keep watching {RagConfig.TRANSCRIPT_DIR} and re-sync changed course folders")
+    return parser.parse_args(argv)
+
+def resolve_folders(args):
+    folders = list(args.folder)
+    prefixes = args.prefix or ([] if folders else RagConfig.COURSE_PREFIXES)
+    for prefix in prefixes:
+        folders.append((os.path.join(RagConfig.TRANSCRIPT_DIR, prefix), prefix))
+    return folders
+
+def sample_chunks(folders, limit, seed=0):
+    """Up to ``limit`` chunk texts from PDFs picked at random across ``folders``."""
+    pdf_paths = sorted(
+        os.path.join(folder, filename)
+        for folder, _ in folders if os.path.isdir(folder)
+        for filename in os.listdir(folder) if filename.endswith('.pdf')
+    )
+    random.Random(seed).shuffle(pdf_paths)
+    chunks = []
+    for pdf_path in pdf_paths:
+        pages = ((page_no, text) for _, page_no, text in iter_pdf_pages(pdf_path))
+        chunks.extend(chunk['text'] for chunk in chunk_pages(pages, RagConfig.CHUNK_SIZE, RagConfig.CHUNK_OVERLAP))
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+def prepare_projection(folders):
+    # Fit once, before any collection is opened with the embedding function
+    path = projection_path_for(RagConfig.PERSIST_DIRECTORY, RagConfig.COLLECTION_NAME)
+    if RagConfig.EMBEDDING_REDUCTION == 'none' or os.path.exists(path):
+        return
+    # Vectors already stored at full width can't be projected after the fact
+    widths = stored_vector_widths(RagConfig.PERSIST_DIRECTORY, RagConfig.COLLECTION_NAME)
+    if widths:
+        raise SystemExit(f"EMBEDDING_REDUCTION is '{RagConfig.EMBEDDING_REDUCTION}' but {path} does not exist and "
+                         f"the store already holds vectors ({widths}). A projection can only be fitted for an "
+                         f"empty store: move {RagConfig.PERSIST_DIRECTORY} aside and ingest again, or set "
+                         f"EMBEDDING_REDUCTION=none")
+    chunks = sample_chunks(folders, RagConfig.EMBEDDING_REDUCTION_SAMPLE)
+    if not chunks:
+        return
+    engine = create_embedding_engine(RagConfig)
+    if RagConfig.EMBEDDING_CACHE_DIR:
+        vectors = EmbeddingCache(RagConfig.EMBEDDING_CACHE_DIR, engine.model_id).embed(chunks, engine)
+    else:
+        vectors = engine(chunks)
+    projection = fit_projection(vectors, RagConfig.EMBEDDING_REDUCED_DIM, RagConfig.EMBEDDING_REDUCTION)
+    projection.save(path)
+    get_embedding_function.cache_clear()
+    print(f"Fitted {projection.method} projection {projection.input_dim} -> {projection.dim} dims "
+          f"on {len(chunks)} chunks")
+
+def publish(shards, changed):
+    # Rebuild derived indexes once per changed collection, then bump the
+    # generation. An API in another process drops its caches, but its open
+    # HNSW index stays stale until a rebuild swap or a restart
+    for collection in changed.values():
+        publish_index_changes(collection, shards.generation, RagConfig.PERSIST_DIRECTORY)
+
+def rebuild(shards, folders, options):
+    # Every new version must hold all the folders its collection serves
+    groups = {}
+    if shards.sharded:
+        for folder, prefix in folders:
+            groups.setdefault(prefix, []).append((folder, prefix))
+    else:
+        course_folders = [(os.path.join(RagConfig.TRANSCRIPT_DIR, p), p) for p in RagConfig.COURSE_PREFIXES]
+        groups[None] = course_folders + [f for f in folders if f not in course_folders]
+    failed = 0
+    for prefix, group in groups.items():
+        result = blue_green_rebuild(shards, prefix, [f for f in group if os.path.isdir(f[0])], options,
+                                    RagConfig.REBUILD_SMOKE_QUERIES, RagConfig.REBUILD_SMOKE_SAMPLES,
+                                    RagConfig.REBUILD_MIN_RATIO, RagConfig.KEEP_COLLECTION_VERSIONS)
+        if not result["swapped"]:
+            print(f"Rebuild of {result['name']} failed: {result['failures']}")
+            failed += 1
+    return failed
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(RagConfig.PERSIST_DIRECTORY, exist_ok=True)
+    prepare_projection(resolve_folders(args))
+    shards = ShardRouter(RagConfig.PERSIST_DIRECTORY, sharded=RagConfig.SHARD_BY_COURSE, opener=open_collection)
+    options = config_options()
+    options["workers"] = args.workers
+
+    if args.mode == 'rebuild':
+        return 1 if rebuild(shards, resolve_folders(args), options) else 0
+
+    failed = 0
+    synced, changed = {}, {}
+    for folder, prefix in resolve_folders(args):
+        if not os.path.isdir(folder):
+            print(f"Skipping {prefix}: {folder} does not exist")
+            continue
+        collection, manifest = shards.collection_for(prefix), shards.manifest_for(prefix)
+        if args.mode == 'full':
+            reset_folder(collection, manifest, prefix)
+        stats = sync_folder(collection, manifest, folder, prefix, **options)
+        failed += stats["failed"]
+        synced[collection.name] = collection
+        # The first run after enabling BM25, exact or two-stage search builds those
+        # indexes even without changes
+        missing = not all(map(os.path.exists, derived_index_paths(RagConfig.PERSIST_DIRECTORY, collection)))
+        if args.mode == 'full' or index_changed(stats) or missing:
+            changed[collection.name] = collection
+
+    publish(shards, changed)
+    for name, collection in sorted(synced.items()):
+        print(f"Collection '{name}' now holds {collection.count()} chunks")
+
+    if args.watch:
+        def resync(prefixes):
+            changed = {}
+            for prefix in sorted(prefixes):
+                collection = shards.collection_for(prefix)
+                stats = sync_folder(collection, shards.manifest_for(prefix),
+                                    os.path.join(RagConfig.TRANSCRIPT_DIR, prefix), prefix, **options)
+                if index_changed(stats):
+                    changed[collection.name] = collection
+            publish(shards, changed)
+
+        watcher = TranscriptWatcher(RagConfig.TRANSCRIPT_DIR, resync,
+                                    debounce_ms=RagConfig.WATCH_DEBOUNCE_MS,
+                                    quiet_ms=RagConfig.WATCH_QUIET_MS)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Clean up the transcript vector store: dedupe, orphan removal and compaction.
+
+Usage (from backend/):
+    python maintain.py                       # report what would be removed
+    python maintain.py --apply               # delete duplicates and orphans, compact and vacuum
+    python maintain.py --apply --no-compact --vacuum
+
+Duplicates are chunks with the same folder, source PDF and text, or
+untracked copies of a PDF the manifest tracks; orphans are chunks whose
+source PDF is gone from TRANSCRIPT_DIR and that no manifest refers to (both
+mostly left over from the old startup ingestion, which re-added every PDF
+under new ids on each boot). Compaction copies what is left into a new
+collection version and swaps the alias (see ``ingest.py --mode rebuild``),
+since Chroma never shrinks its HNSW index in place; chroma.sqlite3 is
+vacuumed afterwards. Don't run ``--apply`` while an ingestion is writing to
+the store.
+"""
+import argparse
+import sys
+
+from config import RagConfig
+from rag.maintenance import compact_collection, delete_ids, directory_size, find_redundant, vacuum
+from rag.shards import ShardRouter
+from rag.store import open_collection
+from rag.sync import publish_index_changes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clean up the transcript vector store.")
+    parser.add_argument('--apply', action='store_true', help="delete and compact (default: only report)")
+    parser.add_argument('--no-compact', dest='compact', action='store_false',
+                        help="skip copying the collection into a fresh version")
+    parser.add_argument('--keep-versions', type=int, default=RagConfig.KEEP_COLLECTION_VERSIONS,
+                        help="collection versions kept after compacting, the live one included (default: %(default)s)")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM chroma.sqlite3 afterwards (always done after compacting)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    shards = ShardRouter(RagConfig.PERSIST_DIRECTORY, sharded=RagConfig.SHARD_BY_COURSE, opener=open_collection)
+    size_before = directory_size(RagConfig.PERSIST_DIRECTORY)
+
+    for prefix in (shards.prefixes() if shards.sharded else [None]):
+        collection, manifest = shards.collection_for(prefix), shards.manifest_for(prefix)
+        before = collection.count()
+        duplicates, orphans = find_redundant(collection, manifest, RagConfig.TRANSCRIPT_DIR)
+        print(f"Collection '{collection.name}': {before} chunks, {len(duplicates)} duplicates, {len(orphans)} orphans")
+        if not args.apply:
+            continue
+
+        delete_ids(collection, duplicates + orphans)
+        if args.compact:
+            name, removed = compact_collection(shards, prefix, args.keep_versions)
+            print(f"Compacted into '{name}', removed {removed or 'no old versions'}")
+        elif duplicates or orphans:
+            publish_index_changes(collection, shards.generation, RagConfig.PERSIST_DIRECTORY)
+        print(f"Collection '{shards.collection_for(prefix).name}': {before} -> "
+              f"{shards.collection_for(prefix).count()} chunks")
+
+    if args.apply and (args.vacuum or args.compact):
+        vacuum(RagConfig.PERSIST_DIRECTORY)
+    size_after = directory_size(RagConfig.PERSIST_DIRECTORY)
+    print(f"On disk: {size_before / 2 ** 20:.1f} MiB -> {size_after / 2 ** 20:.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Ingestion and retrieval helpers for the course chatbot's vector store."""
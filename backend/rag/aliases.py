@@ -0,0 +1,72 @@
+import json
+import os
+import re
+import threading
+import time
+
+# Chroma collection names only allow [a-zA-Z0-9._-], so versions are
+# spelled ``<name>__v<N>`` rather than ``<name>@v<N>``
+VERSION_PATTERN = re.compile(r'^(?P<name>.+)__v(?P<version>\d+)$')
+
+
+def versioned_name(name, version):
+    return f"{name}__v{version}"
+
+def split_version(physical_name):
+    """``(logical name, version)``; an unversioned collection is version 0."""
+    match = VERSION_PATTERN.match(physical_name)
+    return (match['name'], int(match['version'])) if match else (physical_name, 0)
+
+
+class CollectionAlias:
+    """Points a logical collection name at one physical, versioned collection.
+
+    The target lives in ``<name>.alias.json`` next to the collection and is
+    replaced atomically, so readers see either the old or the new version.
+    Without the file the name resolves to itself (a collection from before
+    versioning). Like ``IndexGeneration``, ``resolve`` only re-reads the
+    file when its mtime or size changes.
+    """
+
+    def __init__(self, persist_directory, name):
+        self.name = name
+        self.path = os.path.join(persist_directory, f"{name}.alias.json")
+        self._lock = threading.Lock()
+        self._signature = None
+        self._target = name
+
+    def resolve(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.name
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    self._target = json.load(file).get('target', self.name)
+                self._signature = signature
+            return self._target
+
+    def swap(self, physical_name):
+        """Make ``physical_name`` the collection this alias resolves to."""
+        previous = self.resolve()
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({"name": self.name, "target": physical_name, "previous": previous,
+                       "swapped_at": time.time()}, file)
+        os.replace(tmp_path, self.path)
+        return previous
+
+    def versions(self, collection_names):
+        """``(version, physical name)`` of this alias's collections among ``collection_names``, oldest first."""
+        found = []
+        for physical_name in collection_names:
+            name, version = split_version(physical_name)
+            if name == self.name:
+                found.append((version, physical_name))
+        return sorted(found)
+
+    def next_version(self, collection_names):
+        versions = self.versions(collection_names)
+        return versions[-1][0] + 1 if versions else 1
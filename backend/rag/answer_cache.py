@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Answers to earlier questions, reused for near-identical new ones.
+
+    Entries are grouped by course context and matched by cosine similarity
+    of the question embeddings; a lookup hits when the best match is at
+    least ``threshold`` and younger than ``ttl`` seconds. At most
+    ``max_entries`` answers are kept, least recently used first out. When
+    the index ``generation`` moves on every answer is dropped, since it
+    was grounded in the old transcripts.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600, max_entries=1000, generation=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = generation
+        self._entries = OrderedDict()
+        self._matrices = {}
+        self._next_id = 0
+        self._seen_generation = generation.value() if generation else None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0, "seconds_saved": 0.0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_generation(self):
+        if self.generation is None:
+            return
+        current = self.generation.value()
+        if current != self._seen_generation:
+            self._entries.clear()
+            self._matrices.clear()
+            self._seen_generation = current
+
+    def _matrix(self, course):
+        # Row-stacked unit vectors of one course's entries, rebuilt after changes
+        if course not in self._matrices:
+            entry_ids = [entry_id for entry_id, entry in self._entries.items() if entry["course"] == course]
+            vectors = np.stack([self._entries[i]["vector"] for i in entry_ids]) if entry_ids else None
+            self._matrices[course] = (entry_ids, vectors)
+        return self._matrices[course]
+
+    def lookup(self, course, query_vector):
+        """The cached answer for a similar question in ``course``, or ``None``."""
+        vector = _unit(query_vector)
+        with self._lock:
+            self._check_generation()
+            entry_ids, vectors = self._matrix(course)
+            if vectors is not None:
+                similarities = vectors @ vector
+                now = time.monotonic()
+                for row in np.argsort(-similarities):
+                    if similarities[row] < self.threshold:
+                        break
+                    entry = self._entries[entry_ids[row]]
+                    if entry["expires"] >= now:
+                        self._entries.move_to_end(entry_ids[row])
+                        self.stats["hits"] += 1
+                        self.stats["seconds_saved"] += entry["seconds"]
+                        return entry["answer"]
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, course, query_vector, answer, seconds=0.0):
+        """Remember ``answer``; ``seconds`` is what producing it cost."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_generation()
+            self._entries[self._next_id] = {
+                "course": course,
+                "vector": _unit(query_vector),
+                "answer": answer,
+                "seconds": seconds,
+                "expires": time.monotonic() + self.ttl
+            }
+            self._next_id += 1
+            self._matrices.pop(course, None)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._matrices.pop(evicted["course"], None)
+                self.stats["evictions"] += 1
+
+    def bypass(self):
+        with self._lock:
+            self.stats["bypassed"] += 1
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, size=len(self._entries),
+                        seconds_saved=round(self.stats["seconds_saved"], 3),
+                        hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else 0.0)
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .embedding_cache import normalize_text
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size=1024, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def query_key(query):
+    return normalize_text(query).casefold()
+
+
+class QueryCache:
+    """Caches query embeddings and the ids a retrieval returned.
+
+    Embeddings depend only on the model, so they survive re-indexing.
+    Result ids are dropped whenever the index ``generation`` moves on,
+    which ingestion bumps after every change to the collection.
+    """
+
+    def __init__(self, generation, max_size=1024, ttl=600):
+        self.generation = generation
+        self.embeddings = TTLCache(max_size, ttl)
+        self.results = TTLCache(max_size, ttl)
+        self._seen_generation = generation.value()
+        self.invalidations = 0
+
+    def embed(self, query, embedding_function):
+        key = query_key(query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = embedding_function([query])[0]
+            self.embeddings.put(key, vector)
+        return vector
+
+    def _check_generation(self):
+        current = self.generation.value()
+        if current != self._seen_generation:
+            self.results.clear()
+            self._seen_generation = current
+            self.invalidations += 1
+
+    def lookup_ids(self, query, scope, k):
+        """``(key, ids)`` for a retrieval; pass ``key`` to ``store_ids`` on a miss.
+
+        The key includes the generation, so ids computed while ingestion was
+        running are never served after the index has moved on.
+        """
+        self._check_generation()
+        key = (self._seen_generation, query_key(query), scope, k)
+        return key, self.results.get(key)
+
+    def store_ids(self, key, ids):
+        self.results.put(key, list(ids))
+
+    def to_dict(self):
+        return {
+            "generation": self._seen_generation,
+            "invalidations": self.invalidations,
+            "embeddings": dict(self.embeddings.stats, size=len(self.embeddings)),
+            "results": dict(self.results.stats, size=len(self.results))
+        }
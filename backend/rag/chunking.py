@@ -0,0 +1,75 @@
+def _cut_point(text, limit):
+    # Prefer to end a chunk on a space rather than mid-word
+    cut = text.rfind(' ', limit // 2, limit)
+    return cut if cut != -1 else limit
+
+def chunk_pages(pages, chunk_size=1000, overlap=200):
+    """Split ``(page_no, text)`` pairs into overlapping character windows.
+
+    Whitespace is collapsed first (transcripts often put one word per line).
+    Chunks may run across a page break; each one records the first and last
+    page it covers. Yields dicts with ``text``, ``page_start``, ``page_end``
+    and ``chunk`` (the ordinal within the document).
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    buffer = ""
+    page_offsets = []  # (offset into buffer, page_no) for every page start
+    ordinal = 0
+
+    def page_at(offset):
+        page_no = page_offsets[0][1]
+        for start, number in page_offsets:
+            if start > offset:
+                break
+            page_no = number
+        return page_no
+
+    def emit(end):
+        nonlocal ordinal
+        text = buffer[:end].strip()
+        chunk = None
+        if text:
+            chunk = {
+                "text": text,
+                "page_start": page_at(0),
+                "page_end": page_at(max(end - 1, 0)),
+                "chunk": ordinal
+            }
+            ordinal += 1
+        return chunk
+
+    for page_no, page_text in pages:
+        page_text = " ".join((page_text or "").split())
+        if not page_text:
+            continue
+        if buffer:
+            buffer += " "
+        page_offsets.append((len(buffer), page_no))
+        buffer += page_text
+
+        while len(buffer) >= chunk_size:
+            end = _cut_point(buffer, chunk_size)
+            chunk = emit(end)
+            if chunk:
+                yield chunk
+            # Keep the tail of this chunk as the head of the next one, but
+            # always move forward by at least half a chunk
+            start = max(end - overlap, (end + 1) // 2)
+            space = buffer.find(' ', start, end)
+            if overlap and space != -1:
+                start = space + 1
+            elif not overlap:
+                start = end
+            buffer = buffer[start:]
+            page_offsets = [(offset - start, number) for offset, number in page_offsets]
+            # Drop page starts that are now before the buffer, keeping the page we are inside
+            while len(page_offsets) > 1 and page_offsets[1][0] <= 0:
+                page_offsets.pop(0)
+            page_offsets[0] = (0, page_offsets[0][1])
+
+    if buffer.strip():
+        chunk = emit(len(buffer))
+        if chunk:
+            yield chunk
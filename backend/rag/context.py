@@ -0,0 +1,134 @@
+import math
+
+import numpy as np
+
+from .lexical import reciprocal_rank_fusion
+from .retrieval import retrieve
+
+# Gemini's tokenizer isn't available offline; ~4 characters per token is
+# close enough for English lecture text to keep the prompt bounded.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12, None)
+
+
+def mmr(query_vector, vectors, k, lambda_mult=0.5, relevance=None):
+    """Indices of up to ``k`` vectors chosen by maximal marginal relevance.
+
+    Each pick maximises ``lambda_mult * sim(query, d) - (1 - lambda_mult) *
+    max sim(d, already picked)``, so near-duplicates of a chosen chunk
+    lose out to slightly less relevant but new material. ``relevance``
+    (e.g. reranker scores) replaces ``sim(query, d)`` and is rescaled to
+    0..1 first.
+    """
+    if len(vectors) == 0:
+        return []
+    vectors = _unit(vectors)
+    if relevance is None:
+        relevance = vectors @ _unit(query_vector)
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def format_chunk(document, metadata):
+    metadata = metadata or {}
+    source = metadata.get('source', 'transcript')
+    pages = metadata.get('page_start')
+    if pages is not None and metadata.get('page_end') not in (None, pages):
+        pages = f"{pages}-{metadata['page_end']}"
+    return f"[{source}, p. {pages}]\n{document}" if pages is not None else f"[{source}]\n{document}"
+
+
+def assemble_context(chunks, token_budget):
+    """Join ``(document, metadata)`` chunks in order until ``token_budget`` is used.
+
+    Chunks that don't fit are skipped so a smaller later one can still be
+    used; only a first chunk that alone exceeds the budget is truncated.
+    Returns the context text and the chunks included.
+    """
+    parts, used, remaining = [], [], token_budget
+    for document, metadata in chunks:
+        text = format_chunk(document, metadata)
+        cost = estimate_tokens(text) + 1
+        if cost > remaining:
+            if parts:
+                continue
+            text = text[:max(0, remaining - 1) * CHARS_PER_TOKEN]
+            cost = remaining
+        parts.append(text)
+        used.append((document, metadata))
+        remaining -= cost
+        if remaining <= 0:
+            break
+    return "\n\n".join(parts), used
+
+
+def fetch_candidates(collection, query, embedding_function, folder=None, candidates=20, cache=None,
+                     lexical=None, rrf_k=60):
+    """``(query_vector, documents, metadatas, embeddings)`` for the top chunks.
+
+    With a ``lexical`` (BM25) index the vector and keyword rankings are
+    merged by reciprocal-rank fusion. With a ``QueryCache`` a repeated
+    question skips the embedding model and the searches; the cached ids
+    are fetched directly.
+    """
+    include = ['documents', 'metadatas', 'embeddings']
+    if cache is None:
+        query_vector = embedding_function([query])[0]
+        key, ids = None, None
+    else:
+        query_vector = cache.embed(query, embedding_function)
+        key, ids = cache.lookup_ids(query, folder, candidates)
+
+    if ids is None and lexical is not None:
+        vector_ids = retrieve(collection, query_embedding=query_vector, folder=folder, n_results=candidates,
+                              include=[])['ids'][0]
+        lexical_ids = [record_id for record_id, _ in lexical.search(query, candidates, folder)]
+        ids = reciprocal_rank_fusion([vector_ids, lexical_ids], rrf_k)[:candidates]
+        if cache is not None:
+            cache.store_ids(key, ids)
+
+    if ids is not None:
+        found = collection.get(ids=ids, include=include)
+        position = {record_id: i for i, record_id in enumerate(found['ids'])}
+        rows = [position[record_id] for record_id in ids if record_id in position]
+        return (query_vector, [found['documents'][i] for i in rows],
+                [found['metadatas'][i] for i in rows], [found['embeddings'][i] for i in rows])
+
+    results = retrieve(collection, query_embedding=query_vector, folder=folder, n_results=candidates,
+                       include=include)
+    if cache is not None:
+        cache.store_ids(key, results['ids'][0])
+    return query_vector, results['documents'][0], results['metadatas'][0], results['embeddings'][0]
+
+
+def build_context(collection, query, embedding_function, folder=None, candidates=20,
+                  token_budget=1500, lambda_mult=0.5, cache=None, lexical=None, rrf_k=60, reranker=None):
+    """Top-``candidates`` retrieval, optional reranking, MMR re-ordering and
+    token-budgeted assembly."""
+    query_vector, documents, metadatas, embeddings = fetch_candidates(
+        collection, query, embedding_function, folder, candidates, cache, lexical, rrf_k)
+    if not documents:
+        return "", []
+    relevance = reranker.scores(query, documents) if reranker else None
+    order = mmr(query_vector, embeddings, len(documents), lambda_mult, relevance)
+    return assemble_context(((documents[i], metadatas[i]) for i in order), token_budget)
@@ -0,0 +1,122 @@
+import logging
+import os
+
+import numpy as np
+
+from .exact_index import ExactCollection, ExactIndex, load_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def chunks_path_for(path):
+    """The chunk matrix that goes with the document table at ``path``."""
+    return f"{os.path.splitext(path)[0]}.bin"
+
+
+class DocumentIndex:
+    """Two-level index: one centroid per source PDF, then that PDF's chunks.
+
+    ``search`` scores the query against the document centroids, keeps the
+    best ``top_documents`` and runs an exact search over only their
+    chunks, which are stored contiguously (``offsets[d]:offsets[d + 1]``
+    in ``chunks``). Its cost grows with the number of documents and the
+    size of a few documents, not with the whole corpus.
+    """
+
+    def __init__(self, sources, folders, centroids, offsets, chunks, top_documents=5):
+        self.sources = sources
+        self.folders = folders
+        self.centroids = centroids
+        self.offsets = offsets
+        self.chunks = chunks
+        self.top_documents = top_documents
+        self._folder_masks = {}
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def ids(self):
+        return self.chunks.ids
+
+    def vector(self, row):
+        return self.chunks.vector(row)
+
+    @classmethod
+    def build(cls, ids, metadatas, embeddings, dtype='int8'):
+        documents = {}
+        for row, metadata in enumerate(metadatas):
+            documents.setdefault((metadata.get('folder', ''), metadata.get('source', '')), []).append(row)
+        keys = sorted(documents)
+        order = [row for key in keys for row in documents[key]]
+        offsets = np.cumsum([0] + [len(documents[key]) for key in keys]).astype(np.int64)
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        chunks = ExactIndex.build([ids[row] for row in order], [metadatas[row].get('folder', '') for row in order],
+                                  embeddings[order] if len(order) else embeddings, dtype)
+        centroids = np.zeros((len(keys), embeddings.shape[1] if embeddings.ndim == 2 else 0), dtype=np.float32)
+        for d in range(len(keys)):
+            rows = np.arange(offsets[d], offsets[d + 1])
+            centroid = np.mean([chunks.vector(row) for row in rows], axis=0)
+            centroids[d] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+        return cls([source for _, source in keys], [folder for folder, _ in keys], centroids, offsets, chunks)
+
+    def save(self, path):
+        # Chunks first: the table is what marks the index as present
+        self.chunks.save(chunks_path_for(path))
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, sources=np.array(self.sources, dtype=str), folders=np.array(self.folders, dtype=str),
+                 centroids=self.centroids, offsets=self.offsets)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, top_documents=5):
+        with np.load(path) as data:
+            sources, folders = data["sources"].tolist(), data["folders"].tolist()
+            centroids, offsets = data["centroids"], data["offsets"]
+        return cls(sources, folders, centroids, offsets, ExactIndex.load(chunks_path_for(path)), top_documents)
+
+    def _mask(self, folder):
+        if folder not in self._folder_masks:
+            self._folder_masks[folder] = np.array([f == folder for f in self.folders], dtype=bool)
+        return self._folder_masks[folder]
+
+    def select_documents(self, query_vector, folder=None):
+        """Positions of the ``top_documents`` centroids closest to the query."""
+        if not self.sources:
+            return np.zeros(0, dtype=np.int64)
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = self.centroids @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        if folder is not None:
+            scores[~self._mask(folder)] = -np.inf
+        k = min(self.top_documents, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.argpartition(-scores, k - 1)[:k]
+
+    def search(self, query_vector, k=10, folder=None):
+        documents = self.select_documents(query_vector, folder)
+        if not len(documents):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows = np.concatenate([np.arange(self.offsets[d], self.offsets[d + 1]) for d in documents])
+        return self.chunks.search(query_vector, k, rows=rows)
+
+
+def rebuild_document_index(collection, path, dtype='int8', page_size=1000):
+    """Build the document/chunk index for ``collection`` at ``path``."""
+    index = DocumentIndex.build(*load_embeddings(collection, page_size), dtype)
+    index.save(path)
+    logger.info(f"Document index rebuilt: {len(index.sources)} documents, {len(index)} chunks")
+    return index
+
+
+class TwoStageCollection(ExactCollection):
+    """``ExactCollection`` that searches through a ``DocumentIndex``:
+    the ``top_documents`` closest source PDFs first, then their chunks."""
+
+    def __init__(self, collection, path, generation, top_documents=5, embedding_function=None):
+        super().__init__(collection, path, generation, embedding_function)
+        self.top_documents = top_documents
+
+    def load_index(self):
+        return DocumentIndex.load(self.path, self.top_documents)
@@ -0,0 +1,155 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize('NFC', text).split())
+
+def text_key(text):
+    return hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """Persistent chunk-embedding cache for one embedding model.
+
+    Vectors are appended as raw float32 rows to ``vectors.f32`` and read
+    back through a memory map; ``keys.bin`` holds the matching 16-byte
+    hashes of the whitespace-normalised chunk text in the same row order.
+    Entries are never rewritten, so a crash can at worst lose the tail.
+    Several processes may share the directory (``ingest.py`` and the API's
+    job queue): appends hold an exclusive ``flock`` and take their row
+    numbers from the files themselves, and every instance picks up keys
+    the others appended before looking anything up.
+    """
+
+    KEY_SIZE = 16
+
+    def __init__(self, root, model_id):
+        self.model_id = model_id
+        self.directory = os.path.join(root, re.sub(r'[^A-Za-z0-9._-]+', '_', model_id))
+        self._keys_path = os.path.join(self.directory, 'keys.bin')
+        self._vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self._meta_path = os.path.join(self.directory, 'meta.json')
+        self._lock_path = os.path.join(self.directory, 'append.lock')
+        self._lock = threading.Lock()
+        self._index = {}
+        self._rows = 0
+        self._vectors = None
+        self.dim = None
+        self.stats = {"hits": 0, "misses": 0}
+        with self._lock:
+            self._refresh()
+
+    def __len__(self):
+        return len(self._index)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._lock_path, 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        # Index keys appended (by anyone) since the last look. A key is only
+        # written after its vector, so every complete key has a vector.
+        if self.dim is None:
+            if not os.path.exists(self._meta_path):
+                return
+            with open(self._meta_path, 'r', encoding='utf-8') as file:
+                self.dim = json.load(file)["dim"]
+        try:
+            rows = os.path.getsize(self._keys_path) // self.KEY_SIZE
+        except FileNotFoundError:
+            return
+        if rows <= self._rows:
+            return
+        with open(self._keys_path, 'rb') as file:
+            file.seek(self._rows * self.KEY_SIZE)
+            keys = file.read((rows - self._rows) * self.KEY_SIZE)
+        for offset in range(len(keys) // self.KEY_SIZE):
+            self._index.setdefault(keys[offset * self.KEY_SIZE:(offset + 1) * self.KEY_SIZE], self._rows + offset)
+        self._rows += len(keys) // self.KEY_SIZE
+        self._vectors = None
+
+    def _align_files(self):
+        # Under the file lock: drop a half-written tail (e.g. after a crash)
+        # so both files hold the same number of whole rows before appending
+        key_bytes = os.path.getsize(self._keys_path) if os.path.exists(self._keys_path) else 0
+        vector_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = min(key_bytes // self.KEY_SIZE, vector_bytes // (4 * self.dim))
+        for path, size, current in ((self._keys_path, rows * self.KEY_SIZE, key_bytes),
+                                    (self._vectors_path, rows * 4 * self.dim, vector_bytes)):
+            if current != size:
+                os.truncate(path, size)
+
+    def _matrix(self):
+        if self._vectors is None and self._index:
+            rows = os.path.getsize(self._vectors_path) // (4 * self.dim)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        return self._vectors
+
+    def get_many(self, texts):
+        """Cached vectors for ``texts``, with ``None`` for misses."""
+        with self._lock:
+            self._refresh()
+            matrix = self._matrix()
+            found = []
+            for text in texts:
+                row = self._index.get(text_key(text))
+                found.append(None if row is None else np.array(matrix[row]))
+            hits = sum(vector is not None for vector in found)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(found) - hits
+            return found
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, 'w', encoding='utf-8') as file:
+                    json.dump({"model_id": self.model_id, "dim": self.dim}, file)
+            new_keys, new_rows = {}, []
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key not in self._index and key not in new_keys:
+                    new_keys[key] = len(new_rows)
+                    new_rows.append(vector)
+            if not new_keys:
+                return
+            self._align_files()
+            # Vectors first: a key without its vector would be a corrupt entry
+            with open(self._vectors_path, 'ab') as file:
+                file.write(np.stack(new_rows).astype(np.float32).tobytes())
+            with open(self._keys_path, 'ab') as file:
+                file.write(b"".join(new_keys))
+            # Row numbers are wherever the keys actually landed in keys.bin
+            self._refresh()
+
+    def embed(self, texts, embedding_function):
+        """Embeddings for ``texts``, only calling ``embedding_function`` for misses."""
+        vectors = self.get_many(texts)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+        if missing:
+            computed = embedding_function(list(missing))
+            self.put_many(list(missing), computed)
+            for vector, positions in zip(computed, missing.values()):
+                for i in positions:
+                    vectors[i] = np.asarray(vector, dtype=np.float32)
+        return vectors
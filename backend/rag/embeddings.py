@@ -0,0 +1,192 @@
+import os
+import threading
+
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+
+# Where Chroma's default embedding function keeps its ONNX export of all-MiniLM-L6-v2
+CHROMA_ONNX_MODEL_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'chroma', 'onnx_models', 'all-MiniLM-L6-v2', 'onnx'
+)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+class OnnxEmbeddingEngine(EmbeddingFunction[Documents]):
+    """Sentence embeddings from a local ONNX export (``model.onnx`` + ``tokenizer.json``).
+
+    Mean-pools the last hidden state and L2-normalises, like
+    sentence-transformers. Texts are embedded ``batch_size`` at a time and
+    padded only to the longest text in the batch. ``threads`` caps
+    onnxruntime's intra-op parallelism (0 lets onnxruntime decide).
+    """
+
+    def __init__(self, model_dir=CHROMA_ONNX_MODEL_DIR, model_name='all-MiniLM-L6-v2',
+                 batch_size=32, threads=0, max_seq_length=256):
+        self.model_dir = model_dir
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = threads
+        self.max_seq_length = max_seq_length
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self):
+        return f"onnx:{self.model_name}:{self.max_seq_length}"
+
+    def load(self):
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, 'tokenizer.json'))
+            tokenizer.enable_truncation(max_length=self.max_seq_length)
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            self._session = onnxruntime.InferenceSession(
+                os.path.join(self.model_dir, 'model.onnx'),
+                sess_options=options,
+                providers=['CPUExecutionProvider']
+            )
+            self._tokenizer = tokenizer
+
+    def _embed_batch(self, texts):
+        encoded = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if any(i.name == "token_type_ids" for i in self._session.get_inputs()):
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self._session.run(None, inputs)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return _normalize(pooled)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        self.load()
+        texts = list(input)
+        # Sorting by length keeps padding within a batch to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector
+        return vectors
+
+
+class SentenceTransformerEngine(EmbeddingFunction[Documents]):
+    """Embeddings from a sentence-transformers model on the CPU.
+
+    ``threads`` sets torch's intra-op thread count (0 leaves it alone).
+    """
+
+    def __init__(self, model_name_or_path='all-MiniLM-L6-v2', batch_size=32, threads=0,
+                 max_seq_length=256, local_files_only=False):
+        self.model_name_or_path = model_name_or_path
+        self.batch_size = batch_size
+        self.threads = threads
+        self.max_seq_length = max_seq_length
+        self.local_files_only = local_files_only
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self):
+        name = os.path.basename(os.path.normpath(self.model_name_or_path))
+        return f"st:{name}:{self.max_seq_length}"
+
+    def load(self):
+        with self._lock:
+            if self._model is not None:
+                return
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            model = SentenceTransformer(self.model_name_or_path, device='cpu',
+                                        local_files_only=self.local_files_only)
+            model.max_seq_length = self.max_seq_length
+            self._model = model
+
+    def __call__(self, input: Documents) -> Embeddings:
+        self.load()
+        vectors = self._model.encode(list(input), batch_size=self.batch_size,
+                                     normalize_embeddings=True, convert_to_numpy=True)
+        return list(vectors.astype(np.float32))
+
+
+class DefaultEmbeddingEngine(embedding_functions.ONNXMiniLM_L6_V2):
+    """Chroma's built-in MiniLM embedding function (no tuning knobs).
+
+    With ``model_dir`` the model is read from that directory instead of
+    Chroma's download cache. With ``model_dir`` or ``offline`` set, a
+    missing model is an error rather than a download.
+    """
+
+    model_id = "all-MiniLM-L6-v2"
+
+    def __init__(self, model_dir=None, offline=False):
+        super().__init__()
+        if model_dir:
+            model_dir = os.path.normpath(model_dir)
+            self.DOWNLOAD_PATH = os.path.dirname(model_dir)
+            self.EXTRACTED_FOLDER_NAME = os.path.basename(model_dir)
+        self.offline = offline or bool(model_dir)
+
+    def _download_model_if_not_exists(self):
+        model_dir = os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME)
+        if self.offline:
+            missing = [name for name in ('model.onnx', 'tokenizer.json')
+                       if not os.path.exists(os.path.join(model_dir, name))]
+            if missing:
+                raise FileNotFoundError(f"Embedding model files {missing} not found in {model_dir}")
+            return
+        super()._download_model_if_not_exists()
+
+    def load(self):
+        self(["warm-up"])
+
+
+def local_model_path(config):
+    """``EMBEDDING_MODEL_PATH`` if that directory exists, else ``None``."""
+    path = config.EMBEDDING_MODEL_PATH
+    return path if path and os.path.isdir(path) else None
+
+
+def create_embedding_engine(config):
+    """Build the embedding engine selected by ``config.EMBEDDING_BACKEND``."""
+    backend = config.EMBEDDING_BACKEND
+    model_path = local_model_path(config)
+    if backend == 'default':
+        return DefaultEmbeddingEngine(model_dir=model_path, offline=config.EMBEDDING_OFFLINE)
+    if backend == 'onnx':
+        return OnnxEmbeddingEngine(
+            model_dir=model_path or CHROMA_ONNX_MODEL_DIR,
+            model_name=config.EMBEDDING_MODEL,
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+            threads=config.EMBEDDING_THREADS,
+            max_seq_length=config.EMBEDDING_MAX_SEQ_LENGTH
+        )
+    if backend == 'sentence-transformers':
+        return SentenceTransformerEngine(
+            model_name_or_path=model_path or config.EMBEDDING_MODEL,
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+            threads=config.EMBEDDING_THREADS,
+            max_seq_length=config.EMBEDDING_MAX_SEQ_LENGTH,
+            local_files_only=config.EMBEDDING_OFFLINE or bool(model_path)
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'")
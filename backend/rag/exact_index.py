@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import struct
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# File layout: [header][vectors: count x dim][scales: float32 x count][JSON: ids, folders]
+HEADER = struct.Struct('<4sHHIQQ')  # magic, version, dtype code, dim, count, JSON length
+MAGIC = b'EXVI'
+VERSION = 1
+DTYPES = {1: np.int8, 2: np.float16}
+DTYPE_CODES = {'int8': 1, 'float16': 2}
+
+
+def quantize(vectors, dtype='int8'):
+    """Unit-normalise rows and store them as ``dtype`` with a per-row scale.
+
+    int8 rows use symmetric scaling (``row = q * scale``); float16 rows
+    keep a scale of 1.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    if dtype == 'float16':
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.clip(np.abs(vectors).max(axis=1), 1e-12, None) / 127
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class ExactIndex:
+    """Brute-force cosine search over a memory-mapped, quantized matrix.
+
+    Exact (not approximate) top-k: every row is scored with a
+    matrix-vector product, ``block_rows`` rows at a time so the float32
+    working copy stays small, and the best rows are picked with
+    ``argpartition``.
+    """
+
+    def __init__(self, ids, folders, vectors, scales, block_rows=16384):
+        self.ids = ids
+        self.folders = folders
+        self.vectors = vectors
+        self.scales = scales
+        self.block_rows = block_rows
+        self._folder_masks = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes + self.scales.nbytes
+
+    @classmethod
+    def build(cls, ids, folders, embeddings, dtype='int8'):
+        vectors, scales = quantize(embeddings, dtype) if len(ids) else (np.zeros((0, 0), np.int8), np.zeros(0, np.float32))
+        return cls(list(ids), list(folders), vectors, scales)
+
+    def save(self, path):
+        meta = json.dumps({"ids": self.ids, "folders": self.folders}).encode('utf-8')
+        dtype = 'float16' if self.vectors.dtype == np.float16 else 'int8'
+        count, dim = self.vectors.shape if self.vectors.ndim == 2 else (0, 0)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype], dim, count, len(meta)))
+            file.write(np.ascontiguousarray(self.vectors).tobytes())
+            file.write(self.scales.astype(np.float32).tobytes())
+            file.write(meta)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            magic, version, code, dim, count, meta_length = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not an exact vector index")
+            dtype = np.dtype(DTYPES[code])
+            vectors_end = HEADER.size + count * dim * dtype.itemsize
+            file.seek(vectors_end)
+            scales = np.frombuffer(file.read(4 * count), dtype=np.float32)
+            meta = json.loads(file.read(meta_length))
+        vectors = (np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count, dim))
+                   if count else np.zeros((0, dim), dtype=dtype))
+        return cls(meta["ids"], meta["folders"], vectors, scales)
+
+    def _mask(self, folder):
+        if folder not in self._folder_masks:
+            self._folder_masks[folder] = np.array([f == folder for f in self.folders], dtype=bool)
+        return self._folder_masks[folder]
+
+    def scores(self, query_vector, rows=None):
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        if rows is not None:
+            return (self.vectors[rows].astype(np.float32) @ query) * self.scales[rows]
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), self.block_rows):
+            block = self.vectors[start:start + self.block_rows].astype(np.float32)
+            scores[start:start + len(block)] = (block @ query) * self.scales[start:start + len(block)]
+        return scores
+
+    def search(self, query_vector, k=10, folder=None, rows=None):
+        """``(rows, cosine similarities)`` of the top ``k`` rows, best first.
+
+        ``rows`` (an index array) limits the search to those rows.
+        """
+        if not self.ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.scores(query_vector, rows)
+        if folder is not None:
+            mask = self._mask(folder)
+            scores[~(mask if rows is None else mask[rows])] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return (top if rows is None else rows[top]), scores[top]
+
+    def vector(self, row):
+        return self.vectors[row].astype(np.float32) * self.scales[row]
+
+
+def load_embeddings(collection, page_size=1000):
+    """``(ids, metadatas, embeddings)`` of every chunk in ``collection``, read page by page."""
+    ids, metadatas, embeddings = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=['metadatas', 'embeddings'])
+        if not page['ids']:
+            break
+        ids.extend(page['ids'])
+        metadatas.extend(metadata or {} for metadata in page['metadatas'])
+        embeddings.extend(page['embeddings'])
+        offset += len(page['ids'])
+    return ids, metadatas, embeddings
+
+
+def rebuild_exact_index(collection, path, dtype='int8', page_size=1000):
+    """Copy every embedding in ``collection`` into an exact index at ``path``."""
+    ids, metadatas, embeddings = load_embeddings(collection, page_size)
+    index = ExactIndex.build(ids, [metadata.get('folder', '') for metadata in metadatas], embeddings, dtype)
+    index.save(path)
+    logger.info(f"Exact index rebuilt: {len(index)} chunks, {index.nbytes / 2 ** 20:.1f} MiB ({dtype})")
+    return index
+
+
+class ExactCollection:
+    """Collection-like view that answers ``query`` from an ``ExactIndex``.
+
+    Rankings come from the exact index; documents and metadata are then
+    fetched from the Chroma collection by id, and embeddings are the
+    dequantized rows. ``distances`` are cosine distances. The index file is
+    reloaded whenever the index generation moves on; until one exists, and
+    for filters other than ``folder``, queries go to Chroma as before.
+    """
+
+    def __init__(self, collection, path, generation, embedding_function=None):
+        self.collection = collection
+        self.path = path
+        self.generation = generation
+        self.embedding_function = embedding_function
+        self._index = None
+        self._loaded_generation = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.collection.name
+
+    def count(self):
+        return self.collection.count()
+
+    def get(self, *args, **kwargs):
+        return self.collection.get(*args, **kwargs)
+
+    def load_index(self):
+        return ExactIndex.load(self.path)
+
+    def index(self):
+        current = self.generation.value()
+        with self._lock:
+            if self._loaded_generation != current:
+                self._index = self.load_index() if os.path.exists(self.path) else None
+                self._loaded_generation = current
+            return self._index
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, include=None):
+        index = self.index()
+        folder = where.get("folder") if where else None
+        if index is None or (where and set(where) != {"folder"}):
+            kwargs = {"include": include} if include is not None else {}
+            return self.collection.query(query_embeddings=query_embeddings, query_texts=query_texts,
+                                         n_results=n_results, where=where, **kwargs)
+
+        if query_embeddings is None:
+            embed = self.embedding_function or self.collection._embedding_function
+            query_embeddings = embed(list(query_texts))
+        include = list(include) if include is not None else ['metadatas', 'documents', 'distances']
+        results = {"ids": [], **{field: [] for field in include}}
+        for query_vector in query_embeddings:
+            rows, similarities = index.search(query_vector, n_results, folder)
+            ids = [index.ids[row] for row in rows]
+            results["ids"].append(ids)
+            if 'embeddings' in include:
+                results["embeddings"].append([index.vector(row) for row in rows])
+            if 'distances' in include:
+                results["distances"].append([float(1 - s) for s in similarities])
+            stored = [field for field in ('documents', 'metadatas') if field in include]
+            if stored:
+                found = self.collection.get(ids=ids, include=stored) if ids else {"ids": [], **{f: [] for f in stored}}
+                position = {record_id: i for i, record_id in enumerate(found["ids"])}
+                for field in stored:
+                    results[field].append([found[field][position[record_id]] if record_id in position else None
+                                           for record_id in ids])
+        return results
@@ -0,0 +1,121 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+
+
+def iter_pdf_pages(pdf_path, start=0, end=None):
+    """Yield ``(source, page_no, text)`` for each page, one page at a time.
+
+    Only the current page's text is held in memory, so downstream stages can
+    consume arbitrarily large PDFs with flat memory use. Page numbers are
+    1-based.
+    """
+    source = os.path.basename(pdf_path)
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PdfReader(file)
+        end = len(pdf_reader.pages) if end is None else end
+        for index in range(start, end):
+            yield source, index + 1, pdf_reader.pages[index].extract_text() or ""
+
+def extract_text_from_pdf(pdf_path):
+    return "".join(text for _, _, text in iter_pdf_pages(pdf_path)).strip()
+
+def count_pdf_pages(pdf_path):
+    with open(pdf_path, 'rb') as file:
+        return len(PdfReader(file).pages)
+
+def extract_page_range(pdf_path, start, end):
+    """Page records for pages ``start``..``end - 1``. Runs inside pool workers."""
+    return list(iter_pdf_pages(pdf_path, start, end))
+
+def _split_into_tasks(pdf_path, pages_per_task):
+    page_count = count_pdf_pages(pdf_path)
+    return [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+
+def _plan_tasks(pdf_paths, pages_per_task):
+    # (document number, pdf_path, page range or the error that prevented one),
+    # one document at a time so page counting stays lazy too
+    for doc, pdf_path in enumerate(pdf_paths):
+        try:
+            ranges = _split_into_tasks(pdf_path, pages_per_task)
+        except Exception as e:
+            yield doc, pdf_path, e
+            continue
+        for page_range in ranges:
+            yield doc, pdf_path, page_range
+
+def extract_pdfs_parallel(pdf_paths, workers, pages_per_task=16):
+    """Extract many PDFs on a process pool, yielding ``(pdf_path, pages)``.
+
+    ``pages`` is an iterator of ``(source, page_no, text)`` records that raises
+    if the file could not be parsed. Documents come back in the order of
+    ``pdf_paths`` regardless of which worker finishes first. Files longer than
+    ``pages_per_task`` pages are split into page ranges so one big lecture
+    doesn't pin a single worker. At most ``2 * workers`` page ranges are
+    submitted but not yet consumed, and the next one is only submitted as a
+    result is read, so memory stays flat however large a PDF or folder is.
+    Consume each ``pages`` iterator before advancing; whatever is left of an
+    abandoned one is skipped.
+    """
+    pdf_paths = list(pdf_paths)
+    max_tasks = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = _plan_tasks(pdf_paths, pages_per_task)
+        window = deque()
+
+        def refill():
+            while len(window) < max_tasks:
+                task = next(tasks, None)
+                if task is None:
+                    return
+                doc, pdf_path, page_range = task
+                if isinstance(page_range, Exception):
+                    window.append((doc, None, page_range))
+                else:
+                    window.append((doc, executor.submit(extract_page_range, pdf_path, *page_range), None))
+
+        def pages(doc):
+            while True:
+                refill()
+                if window and window[0][0] < doc:
+                    _, future, _ = window.popleft()
+                    if future:
+                        future.cancel()
+                    continue
+                if not window or window[0][0] != doc:
+                    return
+                _, future, error = window.popleft()
+                if error:
+                    raise error
+                records = future.result()
+                refill()
+                yield from records
+
+        for doc, pdf_path in enumerate(pdf_paths):
+            yield pdf_path, pages(doc)
+
+def iter_documents(pdf_paths, workers=1, pages_per_task=16):
+    """Yield ``(pdf_path, pages)`` in order, serially or on a process pool.
+
+    Consume each ``pages`` iterator before advancing to the next document.
+    """
+    if workers <= 1:
+        for pdf_path in pdf_paths:
+            yield pdf_path, iter_pdf_pages(pdf_path)
+        return
+
+    yield from extract_pdfs_parallel(pdf_paths, workers, pages_per_task)
+
+def extract_texts(pdf_paths, workers=1, pages_per_task=16):
+    """Yield ``(pdf_path, text, error)`` with each document's pages joined."""
+    for pdf_path, pages in iter_documents(pdf_paths, workers, pages_per_task):
+        try:
+            text = "".join(text for _, _, text in pages).strip()
+        except Exception as e:
+            yield pdf_path, None, e
+            continue
+        yield pdf_path, text, None
@@ -0,0 +1,47 @@
+import os
+import threading
+
+
+class IndexGeneration:
+    """A counter in a small file that ingestion bumps whenever the index changes.
+
+    It lives next to the collection so separate processes (``ingest.py``,
+    the API's job queue) all see it. Readers only re-read the file when its
+    mtime or size changes, so checking it per request costs one ``stat``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._value = 0
+
+    def value(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    text = file.read().strip()
+                self._value = int(text) if text.isdigit() else self._value
+                self._signature = signature
+            return self._value
+
+    def bump(self):
+        with self._lock:
+            self._signature = None
+        value = self.value() + 1
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(str(value))
+        os.replace(tmp_path, self.path)
+        return value
+
+
+def index_changed(stats):
+    """Whether a ``sync_folder`` / ``sync_files`` run modified the collection."""
+    return bool(stats and (stats["added"] or stats["updated"] or stats["removed"]))
@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .sync import sync_files, sync_folder
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_transcript_path(transcript_dir, prefix, filename=None):
+    """``transcript_dir/<prefix>`` or a file directly inside it; ``None`` for any other path.
+
+    ``sync_folder`` treats the folder it is given as the whole course and
+    keys the manifest by ``<prefix>/<filename>``, so syncing a subfolder
+    would remove the rest of the course. Nested paths are refused.
+    """
+    base = os.path.realpath(os.path.join(transcript_dir, prefix))
+    if not filename:
+        return base
+    if '/' in filename or '\\' in filename or filename in ('.', '..'):
+        return None
+    path = os.path.join(base, filename)
+    if os.path.dirname(os.path.realpath(path)) != base or os.path.isdir(path):
+        return None
+    return path
+
+
+class IngestJob:
+    """One submitted file or folder and its live progress."""
+
+    def __init__(self, path, prefix):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.prefix = prefix
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {"pages_processed": 0, "chunks_written": 0}
+        self.stats = None
+        self.error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        elapsed = 0.0
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        pages = self.progress["pages_processed"]
+        chunks = self.progress["chunks_written"]
+        return {
+            "id": self.id,
+            "path": self.path,
+            "prefix": self.prefix,
+            "state": self.state,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "pages_processed": pages,
+            "chunks_embedded": chunks,
+            "throughput": {
+                "pages_per_sec": round(pages / elapsed, 2) if elapsed else 0.0,
+                "chunks_per_sec": round(chunks / elapsed, 2) if elapsed else 0.0
+            },
+            "stats": self.stats,
+            "error": self.error
+        }
+
+
+class IngestJobQueue:
+    """Runs ingestion jobs off the request thread with bounded concurrency.
+
+    At most ``max_workers`` jobs run at once, and jobs for the same prefix
+    run one after another. ``options`` are passed through to ``sync_files``
+    / ``sync_folder``. Finished jobs are kept for status queries until more
+    than ``max_jobs_kept`` have accumulated. ``on_complete`` is called with
+    each job once it finishes. Given a ``ShardRouter``, each job updates the
+    collection and manifest of its own prefix instead of ``collection`` /
+    ``manifest``. Given ``transcript_dir``, only the course folder or a file
+    directly inside it (see ``resolve_transcript_path``) can be submitted.
+    """
+
+    def __init__(self, collection=None, manifest=None, max_workers=1, options=None, max_jobs_kept=100,
+                 on_complete=None, router=None, transcript_dir=None):
+        self.collection = collection
+        self.transcript_dir = transcript_dir
+        self.manifest = manifest
+        self.router = router
+        self.options = options or {}
+        self.max_jobs_kept = max_jobs_kept
+        self.on_complete = on_complete
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self._jobs = OrderedDict()
+        self._prefix_locks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, path, prefix):
+        if self.transcript_dir:
+            allowed = {resolve_transcript_path(self.transcript_dir, prefix),
+                       resolve_transcript_path(self.transcript_dir, prefix, os.path.basename(path))}
+            if os.path.realpath(path) not in allowed:
+                raise ValueError(f"{path} is neither the {prefix} course folder nor a file directly inside it")
+        job = IngestJob(path, prefix)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prefix_locks.setdefault(prefix, threading.Lock())
+            self._evict_finished()
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued ingestion job {job.id} for {path} ({prefix})")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def targets(self, prefix):
+        """The ``(collection, manifest)`` that jobs for ``prefix`` update."""
+        if self.router:
+            return self.router.collection_for(prefix), self.router.manifest_for(prefix)
+        return self.collection, self.manifest
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs_kept)]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        with self._prefix_locks[job.prefix]:
+            job.state = "running"
+            job.started_at = time.time()
+            try:
+                collection, manifest = self.targets(job.prefix)
+                if os.path.isdir(job.path):
+                    stats = sync_folder(collection, manifest, job.path, job.prefix,
+                                        progress=job.progress, **self.options)
+                else:
+                    stats = sync_files(collection, manifest, [job.path], job.prefix,
+                                       progress=job.progress, **self.options)
+                    manifest.save()
+                job.stats = stats
+                job.state = "failed" if stats["failed"] else "succeeded"
+            except Exception as e:
+                logger.error(f"Ingestion job {job.id} failed: {str(e)}", exc_info=True)
+                job.error = str(e)
+                job.state = "failed"
+            finally:
+                job.finished_at = time.time()
+
+        logger.info(f"Ingestion job {job.id} {job.state}: {job.progress}")
+        try:
+            if self.on_complete:
+                self.on_complete(job)
+        finally:
+            job._done.set()
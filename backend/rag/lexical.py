@@ -0,0 +1,189 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or so that the this to was were "
+    "we what when which will with you your i do does how can".split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _pack_strings(values):
+    return np.frombuffer("\n".join(values).encode('utf-8'), dtype=np.uint8)
+
+def _unpack_strings(array):
+    text = array.tobytes().decode('utf-8')
+    return text.split("\n") if text else []
+
+
+class BM25Index:
+    """Okapi BM25 over the chunks in the collection.
+
+    Postings are stored CSR-style in flat numpy arrays: the postings of term
+    ``t`` are ``doc_ids[offsets[t]:offsets[t + 1]]`` with matching
+    ``term_freqs``. Each chunk's ``folder`` is kept so a search can be
+    scoped to one course like the vector search.
+    """
+
+    def __init__(self, ids, folders, terms, offsets, doc_ids, term_freqs, doc_lengths, k1=1.2, b=0.75):
+        self.ids = ids
+        self.folders = folders
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self._folder_codes = {}
+        self._folder_array = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, records, k1=1.2, b=0.75):
+        """Index ``(id, document, metadata)`` records."""
+        ids, folders, lengths = [], [], []
+        postings = {}
+        for doc_no, (record_id, document, metadata) in enumerate(records):
+            tokens = tokenize(document or "")
+            ids.append(record_id)
+            folders.append((metadata or {}).get('folder', ''))
+            lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_no, freq))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        doc_ids = np.empty(offsets[-1], dtype=np.uint32)
+        term_freqs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            pairs = np.array(postings[term], dtype=np.int64)
+            doc_ids[offsets[i]:offsets[i + 1]] = pairs[:, 0]
+            term_freqs[offsets[i]:offsets[i + 1]] = np.minimum(pairs[:, 1], np.iinfo(np.uint16).max)
+        return cls(ids, folders, terms, offsets, doc_ids, term_freqs,
+                   np.array(lengths, dtype=np.uint32), k1, b)
+
+    def save(self, path):
+        terms = sorted(self.terms, key=self.terms.get)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, ids=_pack_strings(self.ids), folders=_pack_strings(self.folders),
+                     terms=_pack_strings(terms), offsets=self.offsets, doc_ids=self.doc_ids,
+                     term_freqs=self.term_freqs, doc_lengths=self.doc_lengths,
+                     params=np.array([self.k1, self.b]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            k1, b = data['params']
+            return cls(_unpack_strings(data['ids']), _unpack_strings(data['folders']),
+                       _unpack_strings(data['terms']), data['offsets'], data['doc_ids'],
+                       data['term_freqs'], data['doc_lengths'], float(k1), float(b))
+
+    def _folder_mask(self, folder):
+        if self._folder_array is None:
+            codes = {}
+            self._folder_array = np.array([codes.setdefault(f, len(codes)) for f in self.folders], dtype=np.int32)
+            self._folder_codes = codes
+        code = self._folder_codes.get(folder)
+        return None if code is None else self._folder_array == code
+
+    def search(self, query, k=20, folder=None):
+        """Top ``k`` ``(id, score)`` pairs, best first."""
+        if not self.ids:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_length, 1e-9))
+        for term in set(tokenize(query)):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            idf = math.log(1 + (len(self.ids) - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * freqs * (self.k1 + 1) / (freqs + length_norm[docs])
+        if folder is not None:
+            mask = self._folder_mask(folder)
+            if mask is None:
+                return []
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.ids[i], float(scores[i])) for i in candidates]
+
+
+def iter_collection(collection, page_size=1000):
+    """Every ``(id, document, metadata)`` in the collection, a page at a time."""
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=['documents', 'metadatas'])
+        if not page['ids']:
+            return
+        yield from zip(page['ids'], page['documents'], page['metadatas'])
+        offset += len(page['ids'])
+
+
+def rebuild_lexical_index(collection, path, k1=1.2, b=0.75):
+    """Re-index every chunk in ``collection`` and save the index to ``path``."""
+    index = BM25Index.build(iter_collection(collection), k1, b)
+    index.save(path)
+    logger.info(f"BM25 index rebuilt: {len(index)} chunks, {len(index.terms)} terms")
+    return index
+
+
+class LexicalIndex:
+    """The BM25 index as used while serving.
+
+    Loaded lazily from ``path`` and reloaded whenever the index generation
+    moves on (ingestion rebuilds the file before bumping it). Searches
+    return nothing until an index file exists.
+    """
+
+    def __init__(self, path, generation):
+        self.path = path
+        self.generation = generation
+        self._index = None
+        self._loaded_generation = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        current = self.generation.value()
+        with self._lock:
+            if self._loaded_generation != current:
+                self._index = BM25Index.load(self.path) if os.path.exists(self.path) else None
+                self._loaded_generation = current
+            return self._index
+
+    def search(self, query, k=20, folder=None):
+        index = self.current()
+        return index.search(query, k, folder) if index else []
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Ids from several best-first rankings, ordered by sum of ``1 / (k + rank)``."""
+    scores = {}
+    for ranking in rankings:
+        for rank, record_id in enumerate(ranking, start=1):
+            scores[record_id] = scores.get(record_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+
+import chromadb
+
+from .aliases import versioned_name
+from .embedding_cache import normalize_text
+from .lexical import iter_collection
+from .rebuild import collect_garbage, remove_collection
+from .sync import manifest_path_for, rebuild_derived_indexes
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text):
+    return hashlib.sha256(normalize_text(text or '').encode('utf-8')).hexdigest()
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def tracked_ids(manifest):
+    """Ids the manifest knows about; ``sync_folder`` owns those, maintenance never deletes them."""
+    return {record_id for key in manifest.keys() for record_id in manifest.get(key)["ids"]}
+
+
+def find_redundant(collection, manifest, transcript_dir, page_size=1000):
+    """``(duplicates, orphans)``: ids of chunks that can be deleted.
+
+    A duplicate has the same folder, ``source`` and (whitespace-normalised)
+    text as a chunk seen before; where one of them is in the manifest, that
+    one is kept. Untracked chunks of a PDF the manifest tracks are
+    superseded by its chunks and count as duplicates too (the old startup
+    ingestion stored each PDF as one whole-lecture document). An orphan's
+    ``source`` no longer exists under ``transcript_dir/<folder>`` and no
+    manifest entry refers to it, e.g. the uuid-keyed copies of a PDF that
+    has since been deleted.
+    """
+    tracked = tracked_ids(manifest)
+    tracked_sources = {tuple(key.split('/', 1)) for key in manifest.keys()}
+    kept, exists = {}, {}
+    duplicates, orphans = [], []
+    for record_id, document, metadata in iter_collection(collection, page_size):
+        metadata = metadata or {}
+        folder, source = metadata.get('folder', ''), metadata.get('source')
+        if record_id not in tracked and (folder, source) in tracked_sources:
+            duplicates.append(record_id)
+            continue
+        if source and record_id not in tracked:
+            path = os.path.join(transcript_dir, folder, source)
+            if path not in exists:
+                exists[path] = os.path.exists(path)
+            if not exists[path]:
+                orphans.append(record_id)
+                continue
+        key = (folder, source, content_hash(document))
+        first = kept.setdefault(key, record_id)
+        if first == record_id or (record_id in tracked and first in tracked):
+            continue
+        if record_id in tracked:
+            kept[key] = record_id
+            duplicates.append(first)
+        else:
+            duplicates.append(record_id)
+    return duplicates, orphans
+
+
+def delete_ids(collection, ids, batch_size=1000):
+    for start in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[start:start + batch_size])
+
+
+def compact_collection(router, prefix=None, keep=2, page_size=1000):
+    """Copy the live collection of ``prefix`` into a new version and swap it in.
+
+    Chroma's HNSW segment never gives back the space of deleted vectors, so
+    compaction is a rebuild: ids, documents, metadata and the stored
+    embeddings (nothing is re-embedded) go into ``<name>__v<N>``, which then
+    replaces the live version like a blue/green rebuild. Returns the new
+    name and the versions garbage-collected. ``chroma.sqlite3`` only
+    shrinks once it is vacuumed (see ``vacuum``).
+    """
+    alias = router.alias_for(prefix)
+    live = router.collection_for(prefix)
+    names = chromadb.PersistentClient(path=router.persist_directory).list_collections()
+    name = versioned_name(alias.name, alias.next_version(names))
+    collection = router.opener(router.persist_directory, name)
+    offset = 0
+    while True:
+        page = live.get(limit=page_size, offset=offset, include=['documents', 'metadatas', 'embeddings'])
+        if not page['ids']:
+            break
+        collection.add(ids=page['ids'], documents=page['documents'], metadatas=page['metadatas'],
+                       embeddings=page['embeddings'])
+        offset += len(page['ids'])
+    if collection.count() != live.count():
+        remove_collection(router.persist_directory, name)
+        raise RuntimeError(f"Copy of {live.name} into {name} is incomplete; was ingestion running?")
+
+    live_manifest = manifest_path_for(router.persist_directory, live)
+    if os.path.exists(live_manifest):
+        shutil.copyfile(live_manifest, manifest_path_for(router.persist_directory, collection))
+    rebuild_derived_indexes(collection, router.persist_directory)
+    alias.swap(name)
+    router.generation.bump()
+    return name, collect_garbage(router.persist_directory, alias, keep)
+
+
+def vacuum(persist_directory):
+    """Give the space of deleted rows in Chroma's SQLite file back to the filesystem.
+
+    The full-text index keeps deleted documents around as tombstones until
+    it is merged, so it is optimized first.
+    """
+    connection = sqlite3.connect(os.path.join(persist_directory, 'chroma.sqlite3'))
+    try:
+        connection.execute("INSERT INTO embedding_fulltext_search(embedding_fulltext_search) VALUES('optimize')")
+        connection.commit()
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import threading
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """Records what each transcript PDF contributed to a collection.
+
+    Entries are keyed by ``<prefix>/<filename>`` and hold the file's content
+    hash, its size/mtime at ingestion time, the parameters it was processed
+    with (e.g. chunking) and the collection ids it produced.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        # Background ingestion jobs share one manifest
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') == self.VERSION:
+                self.files = data.get('files', {})
+
+    @staticmethod
+    def key(prefix, filename):
+        return f"{prefix}/{filename}"
+
+    def get(self, key):
+        return self.files.get(key)
+
+    def set(self, key, sha256, size, mtime, ids, params=None):
+        with self._lock:
+            self.files[key] = {
+                "sha256": sha256,
+                "size": size,
+                "mtime": mtime,
+                "params": params or {},
+                "ids": list(ids)
+            }
+
+    def remove(self, key):
+        with self._lock:
+            return self.files.pop(key, None)
+
+    def keys(self, prefix=None):
+        with self._lock:
+            if prefix is None:
+                return set(self.files)
+            return {key for key in self.files if key.startswith(f"{prefix}/")}
+
+    def is_unchanged(self, key, stat, params=None):
+        """Cheap check: same size, mtime and parameters as the last ingestion."""
+        entry = self.files.get(key)
+        return (
+            bool(entry)
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+            and entry.get("params", {}) == (params or {})
+        )
+
+    def save(self):
+        # Write to a temp file first so a crash never leaves a truncated manifest
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({"version": self.VERSION, "files": self.files}, file, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
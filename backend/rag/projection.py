@@ -0,0 +1,99 @@
+import hashlib
+import logging
+import os
+
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('pca', 'random')
+
+
+def projection_path_for(persist_directory, base_name):
+    # One projection per store: every shard must live in the same space
+    return os.path.join(persist_directory, f"{base_name}.projection.npz")
+
+
+class Projection:
+    """A linear map from full-width embeddings down to ``dim`` dimensions.
+
+    ``transform`` computes ``(vectors - mean) @ components.T``. PCA keeps
+    the directions of largest variance in the fitted sample; a random
+    (Gaussian) projection needs no data beyond the input width and
+    preserves distances only approximately.
+    """
+
+    def __init__(self, method, mean, components):
+        self.method = method
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def dim(self):
+        return self.components.shape[0]
+
+    @property
+    def input_dim(self):
+        return self.components.shape[1]
+
+    @property
+    def fingerprint(self):
+        return hashlib.blake2b(self.components.tobytes() + self.mean.tobytes(), digest_size=4).hexdigest()
+
+    def transform(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return (vectors - self.mean) @ self.components.T
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, method=np.array(self.method), mean=self.mean, components=self.components)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data["method"]), data["mean"], data["components"])
+
+
+def fit_projection(vectors, dim, method='pca', seed=0):
+    """Fit a ``method`` projection of ``vectors`` (rows) to ``dim`` dimensions."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if method not in METHODS:
+        raise ValueError(f"Unknown projection method '{method}'")
+    if not 0 < dim <= vectors.shape[1]:
+        raise ValueError(f"Cannot project {vectors.shape[1]}-dim embeddings to {dim} dimensions")
+    if method == 'random':
+        rng = np.random.default_rng(seed)
+        components = rng.normal(size=(dim, vectors.shape[1])) / np.sqrt(dim)
+        return Projection(method, np.zeros(vectors.shape[1]), components)
+    if len(vectors) < dim:
+        raise ValueError(f"PCA to {dim} dimensions needs at least {dim} sample vectors, got {len(vectors)}")
+    mean = vectors.mean(axis=0)
+    _, _, components = np.linalg.svd(vectors - mean, full_matrices=False)
+    return Projection(method, mean, components[:dim])
+
+
+class ProjectedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Wraps an embedding function so its vectors come out projected.
+
+    Used for both ingestion and queries, so stored chunks and questions
+    are always reduced with the same matrix.
+    """
+
+    def __init__(self, base, projection):
+        self.base = base
+        self.projection = projection
+
+    @property
+    def model_id(self):
+        projection = self.projection
+        return f"{self.base.model_id}:{projection.method}{projection.dim}-{projection.fingerprint}"
+
+    def load(self):
+        load = getattr(self.base, 'load', None)
+        if load:
+            load()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return list(self.projection.transform(self.base(input)))
@@ -0,0 +1,129 @@
+import logging
+import os
+import shutil
+import sqlite3
+
+import chromadb
+
+from .aliases import versioned_name
+from .manifest import IngestionManifest
+from .retrieval import retrieve
+from .sync import collection_files, manifest_path_for, rebuild_derived_indexes, sync_folder
+
+logger = logging.getLogger(__name__)
+
+
+def smoke_test(collection, queries=(), prefixes=(), samples=5, min_count=1):
+    """Problems with a freshly built ``collection``; an empty list means it passed.
+
+    The collection must hold at least ``min_count`` chunks, every query
+    must find something in every course ``prefix``, and ``samples`` chunks
+    spread over the collection must each come back in the top 5 for their
+    own text (which catches a broken embedding model).
+    """
+    count = collection.count()
+    if count < max(min_count, 1):
+        return [f"holds {count} chunks, expected at least {max(min_count, 1)}"]
+    failures = []
+    for prefix in prefixes:
+        for query in queries:
+            if not retrieve(collection, query, folder=prefix, n_results=1, include=[])['ids'][0]:
+                failures.append(f"no results for '{query}' in {prefix}")
+    for offset in range(0, count, max(1, count // samples))[:samples]:
+        sample = collection.get(limit=1, offset=offset, include=['documents'])
+        record_id, document = sample['ids'][0], sample['documents'][0]
+        if record_id not in retrieve(collection, document, n_results=5, include=[])['ids'][0]:
+            failures.append(f"chunk {record_id} is not in the top 5 results for its own text")
+    return failures
+
+
+def vector_segment_dirs(persist_directory, collection):
+    """Directories holding the HNSW index of ``collection``, one per vector segment."""
+    connection = sqlite3.connect(os.path.join(persist_directory, 'chroma.sqlite3'))
+    try:
+        rows = connection.execute("SELECT id FROM segments WHERE collection = ? AND scope = 'VECTOR'",
+                                  (str(collection.id),)).fetchall()
+    finally:
+        connection.close()
+    return [os.path.join(persist_directory, segment_id) for segment_id, in rows]
+
+def remove_collection(persist_directory, name, page_size=1000):
+    """Delete collection ``name`` and the files kept next to it.
+
+    Chroma's ``delete_collection`` forgets the collection's segments before
+    it cleans them up, leaving its rows in ``chroma.sqlite3`` and its HNSW
+    segment directory on disk. So the records are deleted first and the
+    directory is removed afterwards.
+    """
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_collection(name, embedding_function=None)
+    paths = collection_files(persist_directory, collection)
+    segment_dirs = vector_segment_dirs(persist_directory, collection)
+    while True:
+        ids = collection.get(limit=page_size, include=[])['ids']
+        if not ids:
+            break
+        collection.delete(ids=ids)
+    client.delete_collection(name)
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    for path in segment_dirs:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def collect_garbage(persist_directory, alias, keep=2):
+    """Delete all but the newest ``keep`` versions behind ``alias``.
+
+    The version the alias points at is never deleted. Keeping the previous
+    one as well (``keep=2``) lets queries that started before the last
+    swap finish, and allows a rollback by swapping back.
+    """
+    names = chromadb.PersistentClient(path=persist_directory).list_collections()
+    current = alias.resolve()
+    versions = [name for _, name in alias.versions(names)]
+    removed = []
+    for name in versions[:max(0, len(versions) - keep)]:
+        if name != current:
+            remove_collection(persist_directory, name)
+            removed.append(name)
+    return removed
+
+
+def blue_green_rebuild(router, prefix, folders, options, smoke_queries=(), smoke_samples=5, min_ratio=0.5,
+                       keep=2):
+    """Rebuild the collection serving ``prefix`` from ``folders`` without downtime.
+
+    ``folders`` (``(path, prefix)`` pairs) are ingested into a new version
+    ``<name>__v<N>`` while the current one keeps serving. If the new
+    version passes ``smoke_test`` (and holds at least ``min_ratio`` of the
+    current chunk count) its derived indexes are built, the alias is
+    swapped, the index generation bumped and old versions collected;
+    otherwise it is deleted and the alias left alone.
+    """
+    alias = router.alias_for(prefix)
+    live_count = router.collection_for(prefix).count()
+    names = chromadb.PersistentClient(path=router.persist_directory).list_collections()
+    name = versioned_name(alias.name, alias.next_version(names))
+    collection = router.opener(router.persist_directory, name)
+    manifest = IngestionManifest(manifest_path_for(router.persist_directory, collection))
+    print(f"Building {name} (serving {alias.resolve()} meanwhile)")
+
+    failed = 0
+    for folder, folder_prefix in folders:
+        failed += sync_folder(collection, manifest, folder, folder_prefix, **options)["failed"]
+    failures = smoke_test(collection, smoke_queries, [p for _, p in folders], smoke_samples,
+                          int(live_count * min_ratio))
+    if failed:
+        failures.append(f"{failed} files failed to ingest")
+    if failures:
+        logger.error(f"{name} failed its smoke test, keeping {alias.resolve()}: {failures}")
+        remove_collection(router.persist_directory, name)
+        return {"name": name, "swapped": False, "failures": failures, "removed": []}
+
+    rebuild_derived_indexes(collection, router.persist_directory)
+    previous = alias.swap(name)
+    router.generation.bump()
+    removed = collect_garbage(router.persist_directory, alias, keep)
+    print(f"Swapped {alias.name}: {previous} -> {name}, removed {removed or 'nothing'}")
+    return {"name": name, "swapped": True, "failures": [], "removed": removed}
@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderScorer:
+    """Scores (query, chunk) pairs with a local sentence-transformers cross-encoder.
+
+    All pairs of a request go through one ``predict`` call, i.e. a single
+    batched forward pass for up to ``batch_size`` candidates.
+    """
+
+    def __init__(self, model_name_or_path='cross-encoder/ms-marco-MiniLM-L-6-v2', batch_size=64,
+                 max_length=256, threads=0, local_files_only=False):
+        self.model_name_or_path = model_name_or_path
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.threads = threads
+        self.local_files_only = local_files_only
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._model is not None:
+                return
+            import torch
+            from sentence_transformers import CrossEncoder
+
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            self._model = CrossEncoder(self.model_name_or_path, max_length=self.max_length, device='cpu',
+                                       local_files_only=self.local_files_only)
+
+    def score(self, query, documents):
+        self.load()
+        pairs = [(query, document) for document in documents]
+        return self._model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+
+class Reranker:
+    """Re-scores retrieval candidates within a hard time budget.
+
+    Scoring runs on a single background thread; if it hasn't finished after
+    ``budget_ms`` (or fails) ``scores()`` returns ``None`` and the caller
+    keeps the vector order. At most one call is ever in flight: a request
+    waits for the running one out of its own budget, and falls back without
+    submitting anything if that runs out first, so work never piles up
+    behind an overrunning call.
+    """
+
+    def __init__(self, scorer, budget_ms=300):
+        self.scorer = scorer
+        self.budget_ms = budget_ms
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rerank')
+        self._idle = threading.Semaphore(1)
+        self.stats = {"reranked": 0, "timeouts": 0, "errors": 0, "busy": 0}
+
+    def _score(self, query, documents):
+        try:
+            return self.scorer.score(query, documents)
+        finally:
+            self._idle.release()
+
+    def scores(self, query, documents):
+        """Relevance scores for ``documents``, or ``None`` to keep the current order."""
+        if not documents:
+            return None
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        if not self._idle.acquire(timeout=self.budget_ms / 1000):
+            self.stats["busy"] += 1
+            logger.warning(f"Reranker still busy after {self.budget_ms} ms; using vector order")
+            return None
+        future = self._executor.submit(self._score, query, list(documents))
+        try:
+            scores = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except TimeoutError:
+            if future.cancel():
+                # Never started, so _score won't release the slot
+                self._idle.release()
+            self.stats["timeouts"] += 1
+            logger.warning(f"Rerank of {len(documents)} candidates exceeded {self.budget_ms} ms; using vector order")
+            return None
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Rerank failed, using vector order: {str(e)}")
+            return None
+        self.stats["reranked"] += 1
+        return np.asarray(scores, dtype=np.float32)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def create_reranker(config):
+    """The reranker configured by ``RERANK_*``, or ``None`` when reranking is off."""
+    if not config.RERANK_ENABLED:
+        return None
+    path = config.RERANK_MODEL_PATH
+    scorer = CrossEncoderScorer(
+        model_name_or_path=path or config.RERANK_MODEL,
+        max_length=config.RERANK_MAX_LENGTH,
+        threads=config.EMBEDDING_THREADS,
+        local_files_only=config.EMBEDDING_OFFLINE or bool(path)
+    )
+    return Reranker(scorer, budget_ms=config.RERANK_BUDGET_MS)
@@ -0,0 +1,44 @@
+from urllib.parse import unquote
+
+from config import RagConfig
+
+
+def course_folder(path_param, config=RagConfig):
+    """Transcript folder (``folder`` metadata) for the chat's course context.
+
+    Accepts a folder prefix (``st``) or a course name as it appears in the
+    frontend URL (``Software%20Testing``, ``software-testing``). Returns
+    ``None`` for unknown courses, which then search the whole collection.
+    """
+    if not path_param:
+        return None
+    name = " ".join(unquote(path_param).replace('-', ' ').replace('_', ' ').lower().split())
+    if name in config.COURSE_PREFIXES:
+        return name
+    return config.COURSE_FOLDERS.get(name)
+
+
+def metadata_filter(folder=None, **metadata):
+    """Chroma ``where`` clause matching every given metadata value (``None`` values are ignored)."""
+    conditions = [{key: value} for key, value in (("folder", folder), *metadata.items()) if value is not None]
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def retrieve(collection, query=None, folder=None, n_results=1, include=None, query_embedding=None, **metadata):
+    """Nearest chunks to ``query``, filtered inside the index to one course folder.
+
+    Pass ``query_embedding`` instead of ``query`` to reuse a vector that has
+    already been computed; ``include`` limits the fields Chroma returns.
+    """
+    kwargs = {"include": include} if include is not None else {}
+    if query_embedding is not None:
+        kwargs["query_embeddings"] = [query_embedding]
+    else:
+        kwargs["query_texts"] = [query]
+    return collection.query(
+        n_results=n_results,
+        where=metadata_filter(folder, **metadata),
+        **kwargs
+    )
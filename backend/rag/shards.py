@@ -0,0 +1,264 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+
+from config import RagConfig
+
+from .aliases import CollectionAlias, split_version
+from .documents import TwoStageCollection
+from .exact_index import ExactCollection
+from .generation import IndexGeneration
+from .lexical import LexicalIndex
+from .manifest import IngestionManifest
+from .store import open_collection
+from .sync import (document_prefix, documents_index_path_for, exact_index_path_for, lexical_index_path_for,
+                   manifest_path_for)
+
+logger = logging.getLogger(__name__)
+
+
+def split_folder(where):
+    """``(folder, remaining where)`` from a ``metadata_filter`` clause."""
+    if not where:
+        return None, where
+    if "folder" in where:
+        return where["folder"], None
+    conditions = where.get("$and")
+    if conditions:
+        folder = next((c["folder"] for c in conditions if "folder" in c), None)
+        if folder is not None:
+            rest = [c for c in conditions if "folder" not in c]
+            return folder, rest[0] if len(rest) == 1 else ({"$and": rest} if rest else None)
+    return None, where
+
+
+class ShardRouter:
+    """Maps course prefixes to the collections that hold them.
+
+    With ``sharded`` every course has its own collection
+    ``<base_name>_<prefix>`` with its own manifest and BM25 index, so a
+    course can be re-indexed on its own and a course-scoped search only
+    touches that course's vectors. Otherwise all courses share
+    ``<base_name>`` and are told apart by the ``folder`` metadata. Either
+    way one index generation covers the whole store. With ``engine='exact'``
+    searches go through each collection's exact (brute-force) index
+    instead of Chroma's HNSW graph; with ``top_documents`` set they first
+    pick that many source PDFs and then search only their chunks.
+
+    Collection names are logical: each resolves through a
+    ``CollectionAlias`` to the physical (versioned) collection it currently
+    points at, so a blue/green rebuild takes effect on the next lookup.
+    """
+
+    def __init__(self, persist_directory=None, base_name=None, prefixes=None, sharded=False,
+                 opener=open_collection, max_workers=4, engine='hnsw', top_documents=None):
+        self.persist_directory = persist_directory or RagConfig.PERSIST_DIRECTORY
+        self.base_name = base_name or RagConfig.COLLECTION_NAME
+        self.sharded = sharded
+        self.opener = opener
+        self.max_workers = max_workers
+        self.engine = engine
+        self.top_documents = top_documents
+        self.generation = IndexGeneration(os.path.join(self.persist_directory, f"{self.base_name}.generation"))
+        self._prefixes = set(RagConfig.COURSE_PREFIXES if prefixes is None else prefixes)
+        self._collections = {}
+        self._manifests = {}
+        self._lexical = {}
+        self._search_targets = {}
+        self._aliases = {}
+        self._current = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._discovered_generation = None
+
+    def shard_name(self, prefix):
+        return f"{self.base_name}_{prefix}" if self.sharded and prefix else self.base_name
+
+    def alias_for(self, prefix=None):
+        name = self.shard_name(prefix)
+        with self._lock:
+            if name not in self._aliases:
+                self._aliases[name] = CollectionAlias(self.persist_directory, name)
+            return self._aliases[name]
+
+    def collection_for(self, prefix=None):
+        alias = self.alias_for(prefix)
+        name = alias.resolve()
+        with self._lock:
+            previous = self._current.get(alias.name)
+            if previous and previous != name:
+                # Swapped: forget the old version's handles so they can be GCed
+                for cache in (self._collections, self._manifests, self._lexical, self._search_targets):
+                    cache.pop(previous, None)
+            self._current[alias.name] = name
+            if name not in self._collections:
+                self._collections[name] = self.opener(self.persist_directory, name)
+            if self.sharded and prefix:
+                self._prefixes.add(prefix)
+            return self._collections[name]
+
+    def manifest_for(self, prefix=None):
+        collection = self.collection_for(prefix)
+        with self._lock:
+            if collection.name not in self._manifests:
+                self._manifests[collection.name] = IngestionManifest(
+                    manifest_path_for(self.persist_directory, collection))
+            return self._manifests[collection.name]
+
+    def lexical_for(self, prefix=None):
+        collection = self.collection_for(prefix)
+        with self._lock:
+            if collection.name not in self._lexical:
+                self._lexical[collection.name] = LexicalIndex(
+                    lexical_index_path_for(self.persist_directory, collection), self.generation)
+            return self._lexical[collection.name]
+
+    def search_target(self, prefix=None):
+        """What a vector search for ``prefix`` should query."""
+        collection = self.collection_for(prefix)
+        if self.engine != 'exact' and not self.top_documents:
+            return collection
+        with self._lock:
+            if collection.name not in self._search_targets:
+                if self.top_documents:
+                    target = TwoStageCollection(collection, documents_index_path_for(self.persist_directory, collection),
+                                                self.generation, self.top_documents)
+                else:
+                    target = ExactCollection(collection, exact_index_path_for(self.persist_directory, collection),
+                                             self.generation)
+                self._search_targets[collection.name] = target
+            return self._search_targets[collection.name]
+
+    def prefixes(self):
+        """Courses with a shard, including ones another process has added since."""
+        if self.sharded:
+            generation = self.generation.value()
+            if generation != self._discovered_generation:
+                start = f"{self.base_name}_"
+                names = chromadb.PersistentClient(path=self.persist_directory).list_collections()
+                logical_names = {split_version(name)[0] for name in names}
+                with self._lock:
+                    self._prefixes.update(name[len(start):] for name in logical_names
+                                          if name.startswith(start) and len(name) > len(start))
+                self._discovered_generation = generation
+        with self._lock:
+            return sorted(self._prefixes)
+
+    def map_shards(self, prefixes, fn):
+        """``[fn(prefix) ...]``, run in parallel when there is more than one shard."""
+        if len(prefixes) == 1:
+            return [fn(prefixes[0])]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='shard-query')
+        return list(self._executor.map(fn, prefixes))
+
+    def search_collection(self):
+        """What retrieval should query: the shared collection, or a view over all shards."""
+        return ShardedCollection(self) if self.sharded else CurrentCollection(self)
+
+    def lexical_index(self):
+        return ShardedLexicalIndex(self)
+
+
+class CurrentCollection:
+    """Collection-like view of whatever the unsharded alias points at right now."""
+
+    def __init__(self, router):
+        self.router = router
+
+    @property
+    def name(self):
+        return self.router.base_name
+
+    def count(self):
+        return self.router.collection_for().count()
+
+    def query(self, *args, **kwargs):
+        return self.router.search_target().query(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self.router.collection_for().get(*args, **kwargs)
+
+
+class ShardedCollection:
+    """Collection-like view over all course shards, for the retrieval code.
+
+    A query scoped to one ``folder`` goes to that course's shard alone;
+    otherwise all shards are queried in parallel and the hits are merged
+    by distance (every shard uses the same embedding model and space).
+    """
+
+    def __init__(self, router):
+        self.router = router
+
+    @property
+    def name(self):
+        return self.router.base_name
+
+    def count(self):
+        return sum(self.router.map_shards(self.router.prefixes(), lambda p: self.router.collection_for(p).count()))
+
+    def query(self, n_results=10, where=None, include=None, **kwargs):
+        folder, where = split_folder(where)
+        prefixes = [folder] if folder else self.router.prefixes()
+        requested = list(include) if include is not None else ['metadatas', 'documents', 'distances']
+        fields = requested + (['distances'] if 'distances' not in requested else [])
+
+        def query_shard(prefix):
+            return self.router.search_target(prefix).query(
+                n_results=n_results, where=where, include=fields, **kwargs)
+
+        results = self.router.map_shards(prefixes, query_shard)
+        if not results:
+            return {"ids": [[]], **{field: [[]] for field in requested}}
+        if len(results) == 1 and 'distances' in requested:
+            return results[0]
+
+        merged = {"ids": [], **{field: [] for field in requested}}
+        for q in range(len(results[0]["ids"])):
+            hits = sorted(
+                ((result["distances"][q][i], s, i) for s, result in enumerate(results)
+                 for i in range(len(result["ids"][q]))),
+                key=lambda hit: hit[0]
+            )[:n_results]
+            merged["ids"].append([results[s]["ids"][q][i] for _, s, i in hits])
+            for field in requested:
+                merged[field].append([results[s][field][q][i] for _, s, i in hits])
+        return merged
+
+    def get(self, ids, include=None):
+        by_prefix = {}
+        for record_id in ids:
+            by_prefix.setdefault(document_prefix(record_id), []).append(record_id)
+        fields = list(include) if include is not None else ['metadatas', 'documents']
+
+        def get_shard(prefix):
+            return self.router.collection_for(prefix).get(ids=by_prefix[prefix], include=fields)
+
+        merged = {"ids": [], **{field: [] for field in fields}}
+        for result in self.router.map_shards(sorted(by_prefix), get_shard) if by_prefix else []:
+            merged["ids"].extend(result["ids"])
+            for field in fields:
+                merged[field].extend(result[field])
+        return merged
+
+
+class ShardedLexicalIndex:
+    """BM25 search over one course shard, or all shards merged by score
+    (or the single collection when unsharded)."""
+
+    def __init__(self, router):
+        self.router = router
+
+    def search(self, query, k=20, folder=None):
+        if not self.router.sharded:
+            return self.router.lexical_for().search(query, k, folder)
+        if folder:
+            return self.router.lexical_for(folder).search(query, k)
+        results = self.router.map_shards(self.router.prefixes(),
+                                         lambda prefix: self.router.lexical_for(prefix).search(query, k))
+        return sorted((hit for hits in results for hit in hits), key=lambda hit: hit[1], reverse=True)[:k]
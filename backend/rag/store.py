@@ -0,0 +1,88 @@
+import functools
+import logging
+import os
+
+import chromadb
+
+from config import RagConfig
+
+from .aliases import split_version
+from .embeddings import create_embedding_engine
+from .projection import Projection, ProjectedEmbeddingFunction, projection_path_for
+
+logger = logging.getLogger(__name__)
+
+# What Chroma uses for collections created without HNSW metadata
+CHROMA_HNSW_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+
+
+@functools.lru_cache(maxsize=None)
+def get_embedding_function():
+    """The embedding engine shared by ingestion and queries (see EMBEDDING_BACKEND).
+
+    With EMBEDDING_REDUCTION set its vectors are passed through the
+    projection ``ingest.py`` fitted for the store, unless the store holds
+    vectors of another width. Call ``cache_clear()`` after fitting one.
+    """
+    engine = create_embedding_engine(RagConfig)
+    if RagConfig.EMBEDDING_REDUCTION == 'none':
+        return engine
+    path = projection_path_for(RagConfig.PERSIST_DIRECTORY, RagConfig.COLLECTION_NAME)
+    if not os.path.exists(path):
+        logger.warning(f"EMBEDDING_REDUCTION is '{RagConfig.EMBEDDING_REDUCTION}' but {path} has not been "
+                       f"fitted yet; run ingest.py. Using full-width embeddings")
+        return engine
+    projection = Projection.load(path)
+    widths = stored_vector_widths(RagConfig.PERSIST_DIRECTORY, RagConfig.COLLECTION_NAME)
+    mismatched = {name: width for name, width in widths.items() if width != projection.dim}
+    if mismatched:
+        logger.error(f"{path} projects to {projection.dim} dims but the store holds vectors of {mismatched}; "
+                     f"using full-width embeddings. Rebuild the store or remove the projection")
+        return engine
+    return ProjectedEmbeddingFunction(engine, projection)
+
+def stored_vector_widths(persist_directory, base_name):
+    """Width of the stored vectors of every non-empty collection (any shard or version) of ``base_name``."""
+    if not os.path.exists(os.path.join(persist_directory, 'chroma.sqlite3')):
+        return {}
+    client = chromadb.PersistentClient(path=persist_directory)
+    widths = {}
+    for name in client.list_collections():
+        logical = split_version(name)[0]
+        if logical != base_name and not logical.startswith(f"{base_name}_"):
+            continue
+        embeddings = client.get_collection(name, embedding_function=None).get(limit=1, include=['embeddings'])
+        if len(embeddings['embeddings']):
+            widths[name] = len(embeddings['embeddings'][0])
+    return widths
+
+def hnsw_metadata(config=RagConfig):
+    """Collection metadata carrying the configured HNSW parameters."""
+    return {
+        "hnsw:space": config.HNSW_SPACE,
+        "hnsw:M": config.HNSW_M,
+        "hnsw:construction_ef": config.HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": config.HNSW_SEARCH_EF
+    }
+
+def open_collection(persist_directory=None, name=None, metadata=None):
+    """Open (or create) the persistent transcript collection.
+
+    This is all the serving path needs; building the collection is the job
+    of ``ingest.py``. HNSW parameters only apply when the collection is
+    created; an existing collection built with other values keeps them
+    (and a warning is logged) until it is rebuilt.
+    """
+    metadata = metadata or hnsw_metadata()
+    client = chromadb.PersistentClient(path=persist_directory or RagConfig.PERSIST_DIRECTORY)
+    collection = client.get_or_create_collection(
+        name=name or RagConfig.COLLECTION_NAME,
+        embedding_function=get_embedding_function(),
+        metadata=metadata
+    )
+    current = {**CHROMA_HNSW_DEFAULTS, **(collection.metadata or {})}
+    mismatched = {key: current[key] for key, value in metadata.items() if current.get(key) != value}
+    if mismatched:
+        logger.warning(f"Collection '{collection.name}' was built with {mismatched}, not the configured "
+                       f"HNSW parameters; rebuild it to apply them")
+    return collection
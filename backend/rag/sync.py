@@ -0,0 +1,290 @@
+import functools
+import hashlib
+import os
+
+from config import RagConfig
+
+from .chunking import chunk_pages
+from .documents import chunks_path_for, rebuild_document_index
+from .embedding_cache import EmbeddingCache
+from .exact_index import rebuild_exact_index
+from .extraction import iter_documents
+from .lexical import rebuild_lexical_index
+from .manifest import IngestionManifest, file_sha256
+from .store import get_embedding_function
+from .text_store import TextStore
+from .writer import BatchWriteError, BatchWriter
+
+
+def manifest_path_for(persist_directory, collection):
+    return os.path.join(persist_directory, f"{collection.name}.manifest.json")
+
+def generation_path_for(persist_directory, collection):
+    return os.path.join(persist_directory, f"{collection.name}.generation")
+
+def lexical_index_path_for(persist_directory, collection):
+    return os.path.join(persist_directory, f"{collection.name}.bm25.npz")
+
+def exact_index_path_for(persist_directory, collection):
+    return os.path.join(persist_directory, f"{collection.name}.exact.bin")
+
+def documents_index_path_for(persist_directory, collection):
+    return os.path.join(persist_directory, f"{collection.name}.documents.npz")
+
+def derived_index_paths(persist_directory, collection, config=RagConfig):
+    """Files built from the collection by ``publish_index_changes``."""
+    paths = []
+    if config.LEXICAL_SEARCH:
+        paths.append(lexical_index_path_for(persist_directory, collection))
+    if config.VECTOR_ENGINE == 'exact':
+        paths.append(exact_index_path_for(persist_directory, collection))
+    if config.TWO_STAGE_RETRIEVAL:
+        paths.append(documents_index_path_for(persist_directory, collection))
+    return paths
+
+def rebuild_derived_indexes(collection, persist_directory, config=RagConfig):
+    """Rebuild the BM25, exact-search and document files of ``collection``."""
+    if config.LEXICAL_SEARCH:
+        rebuild_lexical_index(collection, lexical_index_path_for(persist_directory, collection),
+                              config.BM25_K1, config.BM25_B)
+    if config.VECTOR_ENGINE == 'exact':
+        rebuild_exact_index(collection, exact_index_path_for(persist_directory, collection),
+                            config.EXACT_INDEX_DTYPE)
+    if config.TWO_STAGE_RETRIEVAL:
+        rebuild_document_index(collection, documents_index_path_for(persist_directory, collection),
+                               config.EXACT_INDEX_DTYPE)
+
+def publish_index_changes(collection, generation, persist_directory, config=RagConfig):
+    """Rebuild the indexes derived from the collection, then bump its generation.
+
+    Bumping last means a running API that sees the new generation also
+    finds the rebuilt BM25, exact-search and document files. (Chroma's own
+    HNSW index is only current in the process that wrote it; see
+    ``ingest.py``.)
+    """
+    rebuild_derived_indexes(collection, persist_directory, config)
+    return generation.bump()
+
+def collection_files(persist_directory, collection):
+    """Every file kept next to ``collection`` (manifest and derived indexes)."""
+    documents_path = documents_index_path_for(persist_directory, collection)
+    return [
+        manifest_path_for(persist_directory, collection),
+        lexical_index_path_for(persist_directory, collection),
+        exact_index_path_for(persist_directory, collection),
+        documents_path,
+        chunks_path_for(documents_path)
+    ]
+
+def document_id(prefix, filename, sha256):
+    # Stable across restarts: the same file content always maps to the same id
+    name_hash = hashlib.sha1(filename.encode('utf-8')).hexdigest()[:8]
+    return f"{prefix}_{name_hash}_{sha256[:16]}"
+
+def document_prefix(record_id):
+    """The course prefix of a chunk id made by ``chunk_records``."""
+    return record_id.rsplit('_', 3)[0]
+
+def chunk_records(pages, prefix, filename, sha256, chunk_size=1000, chunk_overlap=200):
+    """Turn a stream of ``(source, page_no, text)`` page records into
+    ``(id, text, metadata)`` chunk records, lazily."""
+    base_id = document_id(prefix, filename, sha256)
+    page_texts = ((page_no, text) for _, page_no, text in pages)
+    for chunk in chunk_pages(page_texts, chunk_size, chunk_overlap):
+        yield (
+            f"{base_id}_{chunk['chunk']}",
+            chunk["text"],
+            {
+                "source": filename,
+                "folder": prefix,
+                "sha256": sha256,
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"],
+                "chunk": chunk["chunk"]
+            }
+        )
+
+def config_options(config=RagConfig):
+    """``sync_folder`` keyword arguments taken from the app configuration."""
+    embed = None
+    if config.EMBEDDING_CACHE_DIR:
+        embedding_function = get_embedding_function()
+        cache = EmbeddingCache(config.EMBEDDING_CACHE_DIR, embedding_function.model_id)
+        embed = functools.partial(cache.embed, embedding_function=embedding_function)
+    return {
+        "workers": config.INGEST_WORKERS,
+        "pages_per_task": config.PAGES_PER_TASK,
+        "chunk_size": config.CHUNK_SIZE,
+        "chunk_overlap": config.CHUNK_OVERLAP,
+        "batch_size": config.WRITE_BATCH_SIZE,
+        "batch_bytes": config.WRITE_BATCH_BYTES,
+        "max_retries": config.WRITE_MAX_RETRIES,
+        "text_store": TextStore(config.TEXT_STORE_DIR) if config.TEXT_STORE_DIR else None,
+        "embed": embed
+    }
+
+def reset_folder(collection, manifest, prefix):
+    """Forget everything ingested under ``prefix`` so the next sync rebuilds it."""
+    collection.delete(where={"folder": prefix})
+    for key in manifest.keys(prefix):
+        manifest.remove(key)
+    manifest.save()
+    print(f"Reset {prefix}")
+
+def sync_files(collection, manifest, pdf_paths, prefix, workers=1, pages_per_task=16,
+               chunk_size=1000, chunk_overlap=200, batch_size=64, batch_bytes=512 * 1024,
+               max_retries=3, progress=None, text_store=None, embed=None):
+    """Ingest the given PDFs under ``prefix``, skipping the ones that haven't changed.
+
+    Unchanged files cost a stat() call and changed files have their new
+    entries written before the old ones are deleted. Extraction runs on
+    ``workers`` processes, and each document is stored as overlapping chunks
+    written through a ``BatchWriter``. A document is only recorded in the
+    manifest once all of its chunks have been written. If ``progress`` is a
+    dict, its ``pages_processed`` and ``chunks_written`` counters are kept
+    up to date while the sync runs. With a ``text_store``, files whose
+    content was extracted before are read back from it instead of PyPDF2,
+    and newly extracted pages are saved to it. ``embed`` (documents ->
+    vectors, e.g. ``EmbeddingCache.embed``) replaces the collection's own
+    embedding step. Returns per-outcome counts plus the writer's progress
+    counters.
+    """
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    progress = progress if progress is not None else {}
+    progress.setdefault("pages_processed", 0)
+    progress.setdefault("chunks_written", 0)
+    to_extract = {}
+    params = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+
+    for pdf_path in pdf_paths:
+        filename = os.path.basename(pdf_path)
+        key = IngestionManifest.key(prefix, filename)
+        stat = os.stat(pdf_path)
+
+        if manifest.is_unchanged(key, stat, params):
+            stats["unchanged"] += 1
+            continue
+
+        entry = manifest.get(key)
+        sha256 = file_sha256(pdf_path)
+        if entry and entry["sha256"] == sha256 and entry.get("params", {}) == params:
+            # Touched but not modified; just refresh the recorded stat
+            manifest.set(key, sha256, stat.st_size, stat.st_mtime, entry["ids"], params)
+            stats["unchanged"] += 1
+            continue
+
+        to_extract[pdf_path] = (key, sha256, stat)
+
+    # Documents whose chunks are (partly) still waiting in the writer's buffer
+    uncommitted = {}
+
+    def commit(doc):
+        new_ids = set(doc["ids"])
+        stale_ids = [old_id for old_id in doc["entry"]["ids"] if old_id not in new_ids] if doc["entry"] else []
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        manifest.set(doc["key"], doc["sha256"], doc["stat"].st_size, doc["stat"].st_mtime, doc["ids"], params)
+        manifest.save()
+        stats["updated" if doc["entry"] else "added"] += 1
+
+    def commit_written():
+        progress["chunks_written"] = chunks_before + writer.stats["records_written"]
+        # After a successful flush every fully streamed document is on disk
+        for key in [key for key, doc in uncommitted.items() if doc["done"]]:
+            commit(uncommitted.pop(key))
+
+    def roll_back(doc):
+        # The previous version stays live; drop whatever new chunks made it in
+        old_ids = set(doc["entry"]["ids"]) if doc["entry"] else set()
+        partial_ids = [new_id for new_id in doc["ids"] if new_id not in old_ids]
+        writer.discard(partial_ids)
+        if partial_ids:
+            collection.delete(ids=partial_ids)
+        stats["failed"] += 1
+
+    def fail_uncommitted(error):
+        for doc in uncommitted.values():
+            print(f"Error processing {doc['filename']}: {str(error)}")
+            roll_back(doc)
+        uncommitted.clear()
+
+    writer = BatchWriter(collection, max_records=batch_size, max_bytes=batch_bytes,
+                         max_retries=max_retries, on_flush=commit_written, embed=embed)
+    chunks_before = progress["chunks_written"]
+
+    def counted(pages):
+        for page in pages:
+            progress["pages_processed"] += 1
+            yield page
+
+    def documents():
+        stored = {path for path, (_, sha256, _) in to_extract.items() if text_store and text_store.has(sha256)}
+        for pdf_path in [path for path in to_extract if path in stored]:
+            yield pdf_path, text_store.iter_pages(to_extract[pdf_path][1], os.path.basename(pdf_path))
+        to_parse = [path for path in to_extract if path not in stored]
+        for pdf_path, pages in iter_documents(to_parse, workers, pages_per_task):
+            yield pdf_path, (text_store.write_through(to_extract[pdf_path][1], pages) if text_store else pages)
+
+    for pdf_path, pages in documents():
+        filename = os.path.basename(pdf_path)
+        key, sha256, stat = to_extract[pdf_path]
+        print(f"Processing file: {filename}")
+        doc = {
+            "key": key, "filename": filename, "sha256": sha256, "stat": stat,
+            "entry": manifest.get(key), "ids": [], "done": False
+        }
+        uncommitted[key] = doc
+
+        # Pages stream through the chunker into the writer, so only a
+        # handful of pages and one batch of chunks are in memory at a time
+        try:
+            for record_id, text, metadata in chunk_records(counted(pages), prefix, filename, sha256,
+                                                           chunk_size, chunk_overlap):
+                doc["ids"].append(record_id)
+                writer.add(record_id, text, metadata)
+        except BatchWriteError as e:
+            fail_uncommitted(e.cause)
+            continue
+        except Exception as e:
+            print(f"Error processing {filename}: {str(e)}")
+            roll_back(uncommitted.pop(key))
+            continue
+
+        doc["done"] = True
+        if not writer.pending:
+            commit_written()
+
+    try:
+        writer.flush()
+    except BatchWriteError as e:
+        fail_uncommitted(e.cause)
+
+    stats.update(writer.stats)
+    return stats
+
+def sync_folder(collection, manifest, folder_path, prefix, progress=None, **options):
+    """Bring ``collection`` in line with the PDFs currently in ``folder_path``.
+
+    New and changed files go through ``sync_files`` (which takes the same
+    keyword options), and files that disappeared from the folder are removed
+    from the collection.
+    """
+    print(f"Syncing folder: {folder_path}, prefix: {prefix}")
+    pdf_paths = [
+        os.path.join(folder_path, filename)
+        for filename in sorted(os.listdir(folder_path))
+        if filename.endswith('.pdf')
+    ]
+    stats = sync_files(collection, manifest, pdf_paths, prefix, progress=progress, **options)
+
+    seen = {IngestionManifest.key(prefix, os.path.basename(path)) for path in pdf_paths}
+    for key in sorted(manifest.keys(prefix) - seen):
+        entry = manifest.remove(key)
+        if entry["ids"]:
+            collection.delete(ids=entry["ids"])
+        print(f"Removed deleted file: {key}")
+        stats["removed"] += 1
+
+    manifest.save()
+    print(f"Synced {prefix}: {stats}")
+    return stats
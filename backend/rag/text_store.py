@@ -0,0 +1,106 @@
+import mmap
+import os
+import struct
+from array import array
+
+import zstandard
+
+# File layout: [page frames...][uint64 offsets x (pages + 1)][footer]
+# Every page is its own zstd frame, so any page range can be decoded on its own.
+FOOTER = struct.Struct('<4sHHIQ')  # magic, version, reserved, page count, index offset
+MAGIC = b'PGST'
+VERSION = 1
+
+
+class PageFile:
+    """Read-only, memory-mapped view of one stored document."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.page_count, index_offset = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a page store file")
+        self._offsets = array('Q')
+        self._offsets.frombytes(self._map[index_offset:index_offset + 8 * (self.page_count + 1)])
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def read_page(self, index):
+        """Text of the 0-based page ``index``."""
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._decompressor.decompress(self._map[start:end]).decode('utf-8')
+
+    def iter_pages(self, start=0, end=None):
+        end = self.page_count if end is None else min(end, self.page_count)
+        for index in range(start, end):
+            yield index + 1, self.read_page(index)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TextStore:
+    """Extracted page text, stored once per PDF content hash.
+
+    Lets re-chunking and re-embedding skip PyPDF2 entirely for files that
+    have been extracted before, and lets callers read just the pages they
+    need (e.g. a chunk's ``page_start``..``page_end``).
+    """
+
+    def __init__(self, root, level=3):
+        self.root = root
+        self.level = level
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], f"{sha256}.pages")
+
+    def has(self, sha256):
+        return os.path.exists(self.path_for(sha256))
+
+    def open(self, sha256):
+        return PageFile(self.path_for(sha256))
+
+    def iter_pages(self, sha256, source, start=0, end=None):
+        """Yield ``(source, page_no, text)`` records, like ``iter_pdf_pages``."""
+        with self.open(sha256) as page_file:
+            for page_no, text in page_file.iter_pages(start, end):
+                yield source, page_no, text
+
+    def read_pages(self, sha256, page_start, page_end):
+        """Joined text of the 1-based, inclusive page range."""
+        with self.open(sha256) as page_file:
+            return "\n".join(text for _, text in page_file.iter_pages(page_start - 1, page_end))
+
+    def write_through(self, sha256, pages):
+        """Pass page records through unchanged while storing them.
+
+        The stored file only becomes visible once ``pages`` has been consumed
+        completely; a failure part-way leaves nothing behind.
+        """
+        path = self.path_for(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        compressor = zstandard.ZstdCompressor(level=self.level)
+        offsets = array('Q', [0])
+        try:
+            with open(tmp_path, 'wb') as file:
+                for record in pages:
+                    frame = compressor.compress(record[2].encode('utf-8'))
+                    file.write(frame)
+                    offsets.append(offsets[-1] + len(frame))
+                    yield record
+                index_offset = offsets[-1]
+                file.write(offsets.tobytes())
+                file.write(FOOTER.pack(MAGIC, VERSION, 0, len(offsets) - 1, index_offset))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
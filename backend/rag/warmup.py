@@ -0,0 +1,57 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """Loads the embedding model and runs a dummy query before serving.
+
+    ``ready`` is only set once both have succeeded, so a readiness probe
+    keeps traffic away until the first real query can be answered without
+    paying for the model load. Other models in ``preload`` (e.g. the
+    reranker) are loaded as well. A failure is kept in ``error`` and leaves
+    the service not ready.
+    """
+
+    def __init__(self, collection, embedding_function, query="warm-up", preload=()):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.preload = preload
+        self.query = query
+        self.ready = threading.Event()
+        self.error = None
+        self.seconds = None
+        self._thread = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            load = getattr(self.embedding_function, 'load', None)
+            if load:
+                load()
+            self.collection.query(query_texts=[self.query], n_results=1)
+            for model in self.preload:
+                model.load()
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Embedding warm-up failed: {str(e)}", exc_info=True)
+            return False
+        self.seconds = time.perf_counter() - start
+        self.error = None
+        self.ready.set()
+        logger.info(f"Embedding model warmed up in {self.seconds:.2f}s")
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='embedding-warmup', daemon=True)
+        self._thread.start()
+        return self
+
+    def to_dict(self):
+        return {
+            "ready": self.ready.is_set(),
+            "warmup_seconds": None if self.seconds is None else round(self.seconds, 3),
+            "error": self.error
+        }
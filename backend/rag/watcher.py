@@ -0,0 +1,64 @@
+import logging
+import os
+import threading
+
+from watchfiles import watch
+
+logger = logging.getLogger(__name__)
+
+
+def pdf_filter(change, path):
+    return path.lower().endswith('.pdf')
+
+
+class TranscriptWatcher:
+    """Watches the transcripts directory and reports which course folders changed.
+
+    Bursts of file events are grouped: a batch is only handed to
+    ``on_change`` once nothing has changed for ``quiet_ms`` (or after
+    ``debounce_ms`` at most). ``on_change`` receives the set of prefixes
+    (first-level sub-folders) that had PDFs added, modified or removed.
+    Since incremental sync skips unchanged files, re-syncing those folders
+    only re-indexes the PDFs that actually changed.
+    """
+
+    def __init__(self, root, on_change, debounce_ms=5000, quiet_ms=1000):
+        self.root = os.path.realpath(root)
+        self.on_change = on_change
+        self.debounce_ms = debounce_ms
+        self.quiet_ms = quiet_ms
+        self._stop = threading.Event()
+        self._thread = None
+
+    def changed_prefixes(self, changes):
+        prefixes = set()
+        for _, path in changes:
+            relative = os.path.relpath(os.path.realpath(path), self.root)
+            parts = relative.split(os.sep)
+            # Only PDFs inside a course folder count, not files at the root
+            if len(parts) >= 2 and parts[0] not in (os.curdir, os.pardir):
+                prefixes.add(parts[0])
+        return prefixes
+
+    def run(self):
+        logger.info(f"Watching {self.root} for transcript changes")
+        for changes in watch(self.root, watch_filter=pdf_filter, debounce=self.debounce_ms,
+                             step=self.quiet_ms, stop_event=self._stop):
+            prefixes = self.changed_prefixes(changes)
+            if not prefixes:
+                continue
+            logger.info(f"Transcript changes in {sorted(prefixes)}")
+            try:
+                self.on_change(prefixes)
+            except Exception as e:
+                logger.error(f"Re-indexing after transcript change failed: {str(e)}", exc_info=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='transcript-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
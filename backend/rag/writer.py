@@ -0,0 +1,107 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriteError(Exception):
+    """A batch could not be written after all retries."""
+
+    def __init__(self, ids, cause):
+        super().__init__(f"Failed to write batch of {len(ids)} records: {cause}")
+        self.ids = ids
+        self.cause = cause
+
+
+class BatchWriter:
+    """Accumulates chunk records and upserts them to a collection in batches.
+
+    A batch is flushed once it holds ``max_records`` records or
+    ``max_bytes`` bytes of document text, whichever comes first. Each batch
+    is embedded in one call, by ``embed`` (documents -> vectors) if given or
+    else by the collection's own embedding function during the upsert.
+    ``add()`` flushes synchronously, which throttles the producer to the
+    speed of the writes. A failed batch is retried with exponential backoff;
+    batches that were already written are never resent. ``on_flush`` is
+    called after every successful batch.
+    """
+
+    def __init__(self, collection, max_records=64, max_bytes=512 * 1024, max_retries=3,
+                 retry_backoff=0.5, on_flush=None, embed=None):
+        self.collection = collection
+        self.embed = embed
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.on_flush = on_flush
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._bytes = 0
+        self.stats = {
+            "records_added": 0,
+            "records_written": 0,
+            "bytes_written": 0,
+            "batches_written": 0,
+            "batches_failed": 0,
+            "retries": 0
+        }
+
+    @property
+    def pending(self):
+        return len(self._ids)
+
+    def add(self, record_id, document, metadata):
+        self._ids.append(record_id)
+        self._documents.append(document)
+        self._metadatas.append(metadata)
+        self._bytes += len(document.encode('utf-8'))
+        self.stats["records_added"] += 1
+        if len(self._ids) >= self.max_records or self._bytes >= self.max_bytes:
+            self.flush()
+
+    def discard(self, ids):
+        """Drop pending (unflushed) records with the given ids."""
+        ids = set(ids)
+        keep = [i for i, record_id in enumerate(self._ids) if record_id not in ids]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._bytes = sum(len(document.encode('utf-8')) for document in self._documents)
+
+    def flush(self):
+        if not self._ids:
+            return
+        ids, documents, metadatas, size = self._ids, self._documents, self._metadatas, self._bytes
+        self._ids, self._documents, self._metadatas, self._bytes = [], [], [], 0
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._write(ids, documents, metadatas)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.stats["batches_failed"] += 1
+                    raise BatchWriteError(ids, e) from e
+                self.stats["retries"] += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Batch of {len(ids)} records failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        self.stats["records_written"] += len(ids)
+        self.stats["bytes_written"] += size
+        self.stats["batches_written"] += 1
+        if self.on_flush:
+            self.on_flush()
+
+    def _write(self, ids, documents, metadatas):
+        embeddings = self.embed(documents) if self.embed else None
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
@@ -1,15 +1,28 @@
 import os
+import time
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-import chromadb
-import uuid
 from app import create_app
+from config import RagConfig
 from google.generativeai import GenerativeModel
 import google.generativeai as genai
 from flask import request, jsonify
 from flask_cors import CORS, cross_origin
+from flask_login import current_user, login_required
+from werkzeug.utils import secure_filename
 import logging
 from pprint import pprint
+from rag.answer_cache import SemanticAnswerCache
+from rag.cache import QueryCache
+from rag.context import build_context
+from rag.generation import index_changed
+from rag.jobs import IngestJobQueue, resolve_transcript_path
+from rag.rerank import create_reranker
+from rag.retrieval import course_folder
+from rag.shards import ShardRouter
+from rag.store import get_embedding_function
+from rag.sync import config_options, publish_index_changes
+from rag.warmup import WarmUp
+from rag.watcher import TranscriptWatcher
 
 
 # Configure logging
@@ -23,7 +36,8 @@ app = create_app()
 
 # Add CORS configuration for the chat endpoint
 CORS(app, resources={
-    r"/v1/chat": {"origins": ["http://localhost:5173", "http://localhost:5000", "http://localhost", "https://editor.swagger.io"], "supports_credentials": True}
+    r"/v1/chat": {"origins": ["http://localhost:5173", "http://localhost:5000", "http://localhost", "https://editor.swagger.io"], "supports_credentials": True},
+    r"/v1/ingest/*": {"origins": ["http://localhost:5173", "http://localhost:5000", "http://localhost", "https://editor.swagger.io"], "supports_credentials": True}
 })
 
 load_dotenv()
@@ -37,61 +51,54 @@ genai.configure(api_key=api_key)
 # Define the model to use
 MODEL = "gemini-2.0-flash"
 
-# Set up ChromaDB client
-PERSIST_DIRECTORY = os.path.join(os.path.dirname(__file__), "vectordb")
-chroma_client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
-collection = chroma_client.get_or_create_collection(name="pdf_embeddings")
-
-def extract_text_from_pdf(pdf_path):
-    text = ""
-    with open(pdf_path, 'rb') as file:
-        pdf_reader = PdfReader(file)
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    return text.strip()
-
-def process_pdfs_in_folder(folder_path, prefix):
-    texts = []
-    ids = []
-    metadatas = []
-    print(f"Processing folder: {folder_path}, prefix: {prefix}")
-    
-    for filename in os.listdir(folder_path):
-        print(f"Processing file: {filename}")
-        if filename.endswith('.pdf'):
-            pdf_path = os.path.join(folder_path, filename)
-            try:
-                text = extract_text_from_pdf(pdf_path)
-                if text:
-                    unique_id = f"{prefix}_{str(uuid.uuid4())}"
-                    texts.append(text)
-                    ids.append(unique_id)
-                    metadatas.append({
-                        "source": filename,
-                        "folder": prefix
-                    })
-                    print(len(texts))
-            except Exception as e:
-                print(f"Error processing {filename}: {str(e)}")
-    
-    return texts, ids, metadatas
-
-def retrieve_embedding(query, category=None):
-    if category:
-        # Filter by metadata if specified
-        filtered_ids = [doc["id"] for doc in collection.get_all_documents() if doc["metadata"]["folder"] == category]
-        results = collection.query(
-            query_texts=[query],
-            n_results=1,
-            ids=filtered_ids
-        )
-    else:
-        results = collection.query(
-            query_texts=[query],
-            n_results=1
-        )
-    
-    return results
+# Flask's debug mode also runs the reloader
+DEBUG = True
+
+# Open the ChromaDB collection(s) built by ingest.py: one per course with
+# SHARD_BY_COURSE, otherwise a single collection shared by all courses
+PERSIST_DIRECTORY = RagConfig.PERSIST_DIRECTORY
+shards = ShardRouter(PERSIST_DIRECTORY, sharded=RagConfig.SHARD_BY_COURSE,
+                     max_workers=RagConfig.SHARD_QUERY_WORKERS, engine=RagConfig.VECTOR_ENGINE,
+                     top_documents=RagConfig.TWO_STAGE_DOCUMENTS if RagConfig.TWO_STAGE_RETRIEVAL else None)
+collection = shards.search_collection()
+
+# Repeated questions skip embedding and search until the index changes;
+# ingestion bumps the generation after every change. Only changes made in
+# this process (job queue, watcher) or swapped in by `ingest.py --mode
+# rebuild` reach the open collections' vector search; after an incremental
+# ingest.py run in another process, restart the API.
+index_generation = shards.generation
+query_cache = QueryCache(index_generation, max_size=RagConfig.QUERY_CACHE_SIZE, ttl=RagConfig.QUERY_CACHE_TTL)
+
+# Keyword (BM25) matches fused with the vector search; rebuilt by ingestion
+lexical_index = shards.lexical_index()
+
+def on_ingest_complete(job):
+    if index_changed(job.stats):
+        publish_index_changes(shards.collection_for(job.prefix), index_generation, PERSIST_DIRECTORY)
+
+# Background ingestion so new material can be added without a restart
+ingest_jobs = IngestJobQueue(
+    router=shards,
+    transcript_dir=RagConfig.TRANSCRIPT_DIR,
+    max_workers=RagConfig.INGEST_JOB_WORKERS,
+    options=config_options(),
+    on_complete=on_ingest_complete
+)
+
+# Reuses first-turn answers for near-identical questions in the same course
+answer_cache = SemanticAnswerCache(
+    threshold=RagConfig.ANSWER_CACHE_THRESHOLD,
+    ttl=RagConfig.ANSWER_CACHE_TTL,
+    max_entries=RagConfig.ANSWER_CACHE_SIZE,
+    generation=index_generation
+) if RagConfig.ANSWER_CACHE_ENABLED else None
+
+# Optional cross-encoder rerank, bounded by RERANK_BUDGET_MS per request
+reranker = create_reranker(RagConfig)
+
+# Readiness: set once the embedding model is loaded and has answered a query
+warm_up = WarmUp(collection, get_embedding_function(), preload=[reranker.scorer] if reranker else [])
 
 # System prompt template for educational context
 def get_system_prompt(course_name=None):
@@ -193,9 +200,40 @@ def chat():
             {"role": "system", "content": system_prompt}
         ]
 
-    # Retrieve relevant embedding context
-    embedding_context = retrieve_embedding(user_message)
-    embedding_context_text = embedding_context['documents'][0][0] if embedding_context.get('documents') else ""
+    # The first turn of a session can reuse the answer to a near-identical
+    # question in the same course; send "bypass_cache": true to always ask Gemini
+    answer_cache_eligible = answer_cache is not None and len(chat_sessions[session_id]) == 1
+    if answer_cache_eligible and data.get('bypass_cache'):
+        answer_cache.bypass()
+        answer_cache_eligible = False
+    if answer_cache_eligible:
+        query_vector = query_cache.embed(user_message, get_embedding_function())
+        cached_answer = answer_cache.lookup(path_param, query_vector)
+        if cached_answer is not None:
+            logger.info("Answered from the semantic answer cache")
+            chat_sessions[session_id].append({"role": "user", "content": f"Original question: {user_message}"})
+            chat_sessions[session_id].append({"role": "assistant", "content": cached_answer})
+            return jsonify({
+                "success": True,
+                "response": cached_answer,
+                "history": chat_sessions[session_id],
+                "cached": True
+            })
+
+    # Retrieve relevant embedding context from the course's own transcripts
+    category = course_folder(path_param) if path_param != 'default' else None
+    logger.debug(f"Retrieval scope: {category or 'all courses'}")
+    embedding_context_text, context_chunks = build_context(
+        collection, user_message, get_embedding_function(), folder=category,
+        candidates=RagConfig.RETRIEVAL_CANDIDATES,
+        token_budget=RagConfig.CONTEXT_TOKEN_BUDGET,
+        lambda_mult=RagConfig.MMR_LAMBDA,
+        cache=query_cache,
+        lexical=lexical_index if RagConfig.LEXICAL_SEARCH else None,
+        rrf_k=RagConfig.RRF_K,
+        reranker=reranker
+    )
+    logger.debug(f"Context: {len(context_chunks)} chunks, {len(embedding_context_text)} characters")
 
     user_query_to_be_fed_to_llm = f"Original question: {user_message}\n\nRelevant context: {embedding_context_text}"
     
@@ -231,6 +269,7 @@ def chat():
                 gemini_messages.append({"role": "model", "parts": [msg["content"]]})
         
         # Create a Gemini model instance
+        llm_start = time.perf_counter()
         model = GenerativeModel(MODEL)
         
         # Send the request to Gemini
@@ -243,13 +282,16 @@ def chat():
         
         # Add the assistant's response to the session history
         chat_sessions[session_id].append({"role": "assistant", "content": assistant_response})
+        if answer_cache_eligible:
+            answer_cache.store(path_param, query_vector, assistant_response, time.perf_counter() - llm_start)
         
         # Return the response
         logger.info("Successfully processed chatbot request")
         return jsonify({
             "success": True,
             "response": assistant_response,
-            "history": chat_sessions[session_id]
+            "history": chat_sessions[session_id],
+            "cached": False
         })
         
     except Exception as e:
@@ -260,6 +302,81 @@ def chat():
         })
 
 
+# Only staff can add material to a course's corpus
+INGEST_ROLES = {'instructor', 'ta', 'admin'}
+
+
+# Queue a file or folder for ingestion
+@app.route('/v1/ingest/jobs', methods=['POST'])
+@login_required
+def submit_ingest_job():
+    if not INGEST_ROLES & {role.name for role in current_user.roles}:
+        return jsonify({
+            "success": False,
+            "message": "Only instructors, TAs and admins can ingest transcripts"
+        }), 403
+
+    uploaded = request.files.get('file')
+    data = request.form if uploaded else (request.get_json(silent=True) or {})
+    prefix = (data.get('prefix') or '').strip().lower()
+
+    if not prefix or secure_filename(prefix) != prefix:
+        return jsonify({
+            "success": False,
+            "message": "A valid course prefix is required"
+        }), 400
+
+    if uploaded:
+        filename = secure_filename(uploaded.filename or '')
+        if not filename.lower().endswith('.pdf'):
+            return jsonify({
+                "success": False,
+                "message": "Only PDF files can be ingested"
+            }), 400
+        os.makedirs(resolve_transcript_path(RagConfig.TRANSCRIPT_DIR, prefix), exist_ok=True)
+        path = resolve_transcript_path(RagConfig.TRANSCRIPT_DIR, prefix, filename)
+        if not path or os.path.exists(path):
+            return jsonify({
+                "success": False,
+                "message": f"{filename} already exists in {prefix}"
+            }), 409
+        uploaded.save(path)
+    else:
+        path = resolve_transcript_path(RagConfig.TRANSCRIPT_DIR, prefix, data.get('path'))
+        if not path:
+            return jsonify({
+                "success": False,
+                "message": "Only the course folder or a file directly inside it can be ingested"
+            }), 400
+        if not os.path.exists(path):
+            return jsonify({
+                "success": False,
+                "message": "Path not found in the transcripts directory"
+            }), 404
+
+    job = ingest_jobs.submit(path, prefix)
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status_url": f"/v1/ingest/jobs/{job.id}"
+    }), 202
+
+
+@app.route('/v1/ingest/jobs/<job_id>', methods=['GET'])
+@login_required
+def ingest_job_status(job_id):
+    job = ingest_jobs.get(job_id)
+    if not job:
+        return jsonify({
+            "success": False,
+            "message": "Job not found"
+        }), 404
+    return jsonify({
+        "success": True,
+        "job": job.to_dict()
+    })
+
+
 # Add a route to check if the API is working
 @app.route('/v1/chatbot-status', methods=['GET'])
 def chatbot_status():
@@ -268,10 +385,21 @@ def chatbot_status():
         "status": "operational",
         "model": MODEL,
         "api_key_set": bool(GEMINI_API_KEY),
-        "active_sessions": len(chat_sessions)
+        "active_sessions": len(chat_sessions),
+        "ready": warm_up.ready.is_set(),
+        "retrieval_cache": query_cache.to_dict(),
+        "rerank": reranker.stats if reranker else None,
+        "answer_cache": answer_cache.to_dict() if answer_cache else None
     })
 
 
+# Readiness probe: 503 until the embedding warm-up has completed
+@app.route('/v1/ready', methods=['GET'])
+def ready():
+    status = warm_up.to_dict()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
 # Add a route to set the API key
 @app.route('/v1/set-api-key', methods=['POST'])
 def set_api_key():
@@ -308,37 +436,33 @@ def main():
     global chat_sessions
     chat_sessions = {}
     
-    # Create vectordb directory if it doesn't exist
-    if not os.path.exists(PERSIST_DIRECTORY):
-        os.makedirs(PERSIST_DIRECTORY)
+    # Transcripts are ingested separately (python ingest.py); serving only
+    # reads the persistent collection, so startup doesn't wait on embedding
+    if collection.count() == 0:
+        logger.warning(f"Collection '{collection.name}' is empty; run `python ingest.py` to build it")
+
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN)
+    # serves, so only it warms up and watches.
+    serving = not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+    # Load the embedding model in the background; /v1/ready reports when done
+    if not RagConfig.WARMUP_ON_STARTUP:
+        warm_up.ready.set()
+    elif serving:
+        warm_up.start()
+
+    # Optionally re-index changed PDFs while serving
+    if RagConfig.WATCH_TRANSCRIPTS and serving:
+        def reindex(prefixes):
+            for prefix in prefixes:
+                ingest_jobs.submit(os.path.join(RagConfig.TRANSCRIPT_DIR, prefix), prefix)
+
+        TranscriptWatcher(RagConfig.TRANSCRIPT_DIR, reindex,
+                          debounce_ms=RagConfig.WATCH_DEBOUNCE_MS,
+                          quiet_ms=RagConfig.WATCH_QUIET_MS).start()
 
-    # Process PDFs from both folders
-    transcript_dir = os.path.join(os.path.dirname(__file__), "transcripts")
-    
-    # Process ST folder
-    st_folder = os.path.join(transcript_dir, "st")
-    if os.path.exists(st_folder):
-        st_texts, st_ids, st_metadatas = process_pdfs_in_folder(st_folder, "st")
-        if st_texts:
-            collection.add(
-                documents=st_texts,
-                ids=st_ids,
-                metadatas=st_metadatas
-            )
-    
-    # Process SE folder
-    se_folder = os.path.join(transcript_dir, "se")
-    if os.path.exists(se_folder):
-        se_texts, se_ids, se_metadatas = process_pdfs_in_folder(se_folder, "se")
-        if se_texts:
-            collection.add(
-                documents=se_texts,
-                ids=se_ids,
-                metadatas=se_metadatas
-            )
-    
     # Run the Flask app
-    app.run(debug=True, port=5000)
+    app.run(debug=DEBUG, port=5000)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import shutil
+
+import chromadb
+import pytest
+from chromadb import EmbeddingFunction
+
+TRANSCRIPTS = os.path.join(os.path.dirname(__file__), '..', 'transcripts')
+ST_PDFS = sorted(
+    os.path.join(TRANSCRIPTS, 'st', name)
+    for name in os.listdir(os.path.join(TRANSCRIPTS, 'st'))
+)
+
+
+class FakeEmbeddingFunction(EmbeddingFunction):
+    """Deterministic offline embeddings so tests never download a model."""
+
+    model_id = 'fake'
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            digest = hashlib.sha256(text.encode('utf-8')).digest()
+            vectors.append([byte / 255.0 for byte in digest[:16]])
+        return vectors
+
+
+@pytest.fixture
+def collection(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / 'vectordb'))
+    return client.get_or_create_collection(
+        name='pdf_embeddings',
+        embedding_function=FakeEmbeddingFunction()
+    )
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / 'st'
+    path.mkdir()
+    for pdf in ST_PDFS[:2]:
+        shutil.copy(pdf, path)
+    return path
+
+@pytest.fixture
+def opener():
+    """A ``ShardRouter`` opener whose collections use the fake embeddings."""
+    def open_fake_collection(directory, name):
+        client = chromadb.PersistentClient(path=directory)
+        return client.get_or_create_collection(name=name, embedding_function=FakeEmbeddingFunction())
+    return open_fake_collection
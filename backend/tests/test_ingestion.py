@@ -0,0 +1,559 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import ingest
+import numpy as np
+import pytest
+
+from rag.chunking import chunk_pages
+from rag.embedding_cache import EmbeddingCache
+from rag.embeddings import DefaultEmbeddingEngine, OnnxEmbeddingEngine, create_embedding_engine
+from rag.extraction import count_pdf_pages, extract_pdfs_parallel, extract_texts, iter_pdf_pages
+from rag.generation import IndexGeneration
+from rag.lexical import BM25Index
+from rag.jobs import IngestJobQueue, resolve_transcript_path
+from rag.maintenance import compact_collection, delete_ids, directory_size, find_redundant, vacuum
+from rag.manifest import IngestionManifest
+from rag.projection import Projection, ProjectedEmbeddingFunction, fit_projection
+from rag.rebuild import blue_green_rebuild, collect_garbage, vector_segment_dirs
+from rag.retrieval import retrieve
+from rag.shards import ShardRouter
+from rag.store import get_embedding_function, open_collection
+from rag.sync import sync_folder
+from rag.text_store import TextStore
+from rag.warmup import WarmUp
+from rag.watcher import TranscriptWatcher
+from rag.writer import BatchWriteError, BatchWriter
+
+from conftest import ST_PDFS, FakeEmbeddingFunction
+
+
+def test_sync_folder_is_incremental(collection, folder, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+
+    stats = sync_folder(collection, manifest, str(folder), 'st')
+    assert stats['added'] == 2
+    chunk_count = collection.count()
+    assert chunk_count == sum(len(manifest.get(key)['ids']) for key in manifest.keys('st'))
+
+    # A second run does no work and adds no duplicates
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+    stats = sync_folder(collection, manifest, str(folder), 'st')
+    assert stats['unchanged'] == 2
+    assert stats['added'] == stats['updated'] == 0
+    assert collection.count() == chunk_count
+
+def test_sync_folder_replaces_changed_and_removes_deleted(collection, folder, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+    sync_folder(collection, manifest, str(folder), 'st')
+    first, second = sorted(os.listdir(folder))
+    old_ids = manifest.get(f'st/{first}')['ids']
+
+    shutil.copy(ST_PDFS[2], folder / first)
+    os.remove(folder / second)
+    stats = sync_folder(collection, manifest, str(folder), 'st')
+
+    assert stats['updated'] == 1
+    assert stats['removed'] == 1
+    assert collection.count() == len(manifest.get(f'st/{first}')['ids'])
+    assert collection.get(ids=old_ids)['ids'] == []
+    assert manifest.keys('st') == {f'st/{first}'}
+
+def test_parallel_extraction_matches_serial_order(tmp_path):
+    broken = tmp_path / 'broken.pdf'
+    broken.write_bytes(b'not a pdf')
+    paths = ST_PDFS[:3] + [str(broken)]
+
+    serial = list(extract_texts(paths, workers=1))
+    parallel = list(extract_texts(paths, workers=2, pages_per_task=2))
+
+    assert [path for path, _, _ in parallel] == paths
+    assert [text for _, text, _ in parallel] == [text for _, text, _ in serial]
+    assert parallel[-1][2] is not None
+
+
+def test_parallel_extraction_bounds_outstanding_page_ranges(monkeypatch):
+    submitted = []
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            submitted.append(args)
+            return super().submit(fn, *args)
+
+    monkeypatch.setattr('rag.extraction.ProcessPoolExecutor', CountingExecutor)
+    documents = extract_pdfs_parallel(ST_PDFS[:2], workers=2, pages_per_task=1)
+    path, pages = next(documents)
+    next(pages)
+    # One page read: the window of 2 * workers ranges plus one refill
+    assert len(submitted) <= 5
+
+    # Abandoning a document mid-way skips the rest of its ranges
+    second_path, second_pages = next(documents)
+    assert second_path == ST_PDFS[1]
+    assert [page_no for _, page_no, _ in second_pages] == list(range(1, count_pdf_pages(ST_PDFS[1]) + 1))
+
+def test_sync_folder_stores_chunks_with_page_metadata(collection, folder, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+    sync_folder(collection, manifest, str(folder), 'st', chunk_size=500, chunk_overlap=100)
+    small_count = collection.count()
+
+    result = collection.get(include=['documents', 'metadatas'])
+    assert all(len(document) <= 500 for document in result['documents'])
+    metadata = result['metadatas'][0]
+    assert metadata['folder'] == 'st'
+    assert 1 <= metadata['page_start'] <= metadata['page_end']
+    assert {'source', 'sha256', 'chunk'} <= set(metadata)
+
+    # New chunking parameters re-chunk unchanged files and replace old chunks
+    stats = sync_folder(collection, manifest, str(folder), 'st', chunk_size=2000, chunk_overlap=100)
+    assert stats['updated'] == 2
+    assert collection.count() < small_count
+
+def test_chunk_pages_tracks_page_ranges_and_overlap():
+    pages = [(1, 'alpha ' * 50), (2, 'beta ' * 50)]
+    chunks = list(chunk_pages(pages, chunk_size=100, overlap=20))
+
+    assert [chunk['chunk'] for chunk in chunks] == list(range(len(chunks)))
+    assert chunks[0]['page_start'] == chunks[0]['page_end'] == 1
+    assert chunks[-1]['page_start'] == chunks[-1]['page_end'] == 2
+    assert any(chunk['page_start'] == 1 and chunk['page_end'] == 2 for chunk in chunks)
+    assert all(len(chunk['text']) <= 100 for chunk in chunks)
+    # Neighbouring chunks share text
+    assert chunks[1]['text'][:10] in chunks[0]['text']
+
+def test_iter_pdf_pages_streams_page_records():
+    pages = iter_pdf_pages(ST_PDFS[0])
+    source, page_no, text = next(pages)
+    assert source == os.path.basename(ST_PDFS[0])
+    assert page_no == 1
+    assert [record[1] for record in pages][0] == 2
+
+def test_sync_folder_reports_unreadable_files(collection, folder, tmp_path, capsys):
+    (folder / 'broken.pdf').write_bytes(b'not a pdf')
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+
+    stats = sync_folder(collection, manifest, str(folder), 'st')
+
+    assert stats['added'] == 2
+    assert stats['failed'] == 1
+    assert manifest.get('st/broken.pdf') is None
+    assert 'Error processing broken.pdf' in capsys.readouterr().out
+
+
+class FlakyCollection:
+    """Records upserts and fails the calls whose number is in ``fail_on``."""
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.calls = 0
+        self.batches = []
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        self.calls += 1
+        if self.calls in self.fail_on:
+            raise RuntimeError('embedding service unavailable')
+        self.batches.append(list(ids))
+
+
+def test_batch_writer_batches_by_count_and_bytes():
+    collection = FlakyCollection()
+    with BatchWriter(collection, max_records=3, max_bytes=1000) as writer:
+        for i in range(5):
+            writer.add(f'id{i}', 'x', {})
+        writer.add('big', 'y' * 2000, {})
+
+    assert collection.batches == [['id0', 'id1', 'id2'], ['id3', 'id4', 'big']]
+    assert writer.stats['records_written'] == 6
+    assert writer.stats['batches_written'] == 2
+
+def test_batch_writer_retries_only_the_failed_batch():
+    collection = FlakyCollection(fail_on={2})
+    writer = BatchWriter(collection, max_records=2, retry_backoff=0)
+    for i in range(4):
+        writer.add(f'id{i}', 'text', {})
+    writer.flush()
+
+    assert collection.batches == [['id0', 'id1'], ['id2', 'id3']]
+    assert writer.stats['retries'] == 1
+
+def test_batch_writer_gives_up_after_max_retries():
+    collection = FlakyCollection(fail_on={1, 2})
+    writer = BatchWriter(collection, max_records=10, max_retries=1, retry_backoff=0)
+    writer.add('id0', 'text', {})
+
+    with pytest.raises(BatchWriteError) as excinfo:
+        writer.flush()
+    assert excinfo.value.ids == ['id0']
+    assert writer.stats['batches_failed'] == 1
+    assert writer.pending == 0
+
+def test_ingest_command_incremental_and_full(collection, folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'open_collection', lambda *args: collection)
+    monkeypatch.setattr(ingest.RagConfig, 'PERSIST_DIRECTORY', str(tmp_path / 'vectordb'))
+    monkeypatch.setattr(ingest.RagConfig, 'TEXT_STORE_DIR', str(tmp_path / 'textstore'))
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_CACHE_DIR', str(tmp_path / 'embedding_cache'))
+    monkeypatch.setattr('rag.sync.get_embedding_function', FakeEmbeddingFunction)
+
+    generation = IndexGeneration(str(tmp_path / 'vectordb' / f'{collection.name}.generation'))
+
+    assert ingest.main(['--folder', f'{folder}:st']) == 0
+    chunk_count = collection.count()
+    assert chunk_count > 0
+    assert generation.value() == 1
+    assert len(BM25Index.load(str(tmp_path / 'vectordb' / f'{collection.name}.bm25.npz'))) == chunk_count
+
+    assert ingest.main(['--folder', f'{folder}:st']) == 0
+    assert collection.count() == chunk_count
+    assert generation.value() == 1
+
+    assert ingest.main(['--folder', f'{folder}:st', '--mode', 'full']) == 0
+    assert collection.count() == chunk_count
+    assert generation.value() == 2
+
+def test_ingest_job_queue_reports_progress(collection, folder, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+    completed = []
+    queue = IngestJobQueue(collection, manifest, on_complete=completed.append)
+
+    folder_job = queue.submit(str(folder), 'st')
+    assert folder_job.wait(timeout=60)
+    file_job = queue.submit(ST_PDFS[3], 'st')
+    assert file_job.wait(timeout=60)
+    queue.shutdown()
+
+    status = folder_job.to_dict()
+    assert status['state'] == 'succeeded'
+    assert status['pages_processed'] > 0
+    assert status['chunks_embedded'] == collection.count() - len(manifest.get(f'st/{os.path.basename(ST_PDFS[3])}')['ids'])
+    assert status['throughput']['pages_per_sec'] > 0
+    # A single file is added without removing the folder's other files
+    assert file_job.to_dict()['stats']['added'] == 1
+    assert len(manifest.keys('st')) == 3
+    assert completed == [folder_job, file_job]
+    assert queue.get(folder_job.id) is folder_job
+
+def test_ingest_job_queue_refuses_subfolders_of_a_course(collection, folder, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+    sync_folder(collection, manifest, str(folder), 'st')
+    chunk_count = collection.count()
+    (folder / 'week1').mkdir()
+    shutil.copy(ST_PDFS[3], folder / 'week1')
+
+    transcript_dir = str(tmp_path)
+    assert resolve_transcript_path(transcript_dir, 'st') == os.path.realpath(folder)
+    assert resolve_transcript_path(transcript_dir, 'st', 'week1') is None
+    assert resolve_transcript_path(transcript_dir, 'st', f'week1/{os.path.basename(ST_PDFS[3])}') is None
+    assert resolve_transcript_path(transcript_dir, 'st', '../st/x.pdf') is None
+
+    queue = IngestJobQueue(collection, manifest, transcript_dir=transcript_dir)
+    with pytest.raises(ValueError):
+        queue.submit(str(folder / 'week1'), 'st')
+    with pytest.raises(ValueError):
+        queue.submit(ST_PDFS[3], 'st')
+    job = queue.submit(str(folder), 'st')
+    assert job.wait(timeout=60)
+    queue.shutdown()
+    # The course keeps its documents; the subfolder's PDF is not picked up either
+    assert job.stats['unchanged'] == 2 and job.stats['removed'] == 0
+    assert collection.count() == chunk_count
+
+def test_transcript_watcher_reports_changed_course_folders(tmp_path):
+    (tmp_path / 'st').mkdir()
+    (tmp_path / 'se').mkdir()
+    changed = []
+    seen = threading.Event()
+
+    def on_change(prefixes):
+        changed.append(prefixes)
+        seen.set()
+
+    watcher = TranscriptWatcher(str(tmp_path), on_change, debounce_ms=2000, quiet_ms=200).start()
+    try:
+        threading.Event().wait(0.5)  # let the watcher attach
+        shutil.copy(ST_PDFS[0], tmp_path / 'st')
+        (tmp_path / 'se' / 'notes.txt').write_text('ignored')
+        assert seen.wait(timeout=10)
+    finally:
+        watcher.stop(timeout=5)
+
+    assert changed[0] == {'st'}
+
+def test_text_store_round_trips_page_ranges(tmp_path):
+    store = TextStore(str(tmp_path / 'textstore'))
+    pages = list(iter_pdf_pages(ST_PDFS[0]))
+
+    assert list(store.write_through('ab' * 32, iter(pages))) == pages
+    assert store.has('ab' * 32)
+    assert list(store.iter_pages('ab' * 32, pages[0][0])) == pages
+    assert store.read_pages('ab' * 32, 2, 3) == pages[1][2] + '\n' + pages[2][2]
+
+    # An extraction that fails part-way leaves nothing behind
+    def failing():
+        yield pages[0]
+        raise RuntimeError('corrupt page')
+    with pytest.raises(RuntimeError):
+        list(store.write_through('cd' * 32, failing()))
+    assert not store.has('cd' * 32)
+
+def test_sync_folder_rechunks_from_text_store(collection, folder, tmp_path, monkeypatch):
+    store = TextStore(str(tmp_path / 'textstore'))
+    manifest = IngestionManifest(str(tmp_path / 'manifest.json'))
+    sync_folder(collection, manifest, str(folder), 'st', text_store=store)
+    first_documents = sorted(collection.get()['documents'])
+
+    def no_pdf_parsing(pdf_paths, *args, **kwargs):
+        assert pdf_paths == [], 'PDF was parsed again'
+        return iter(())
+    monkeypatch.setattr('rag.sync.iter_documents', no_pdf_parsing)
+
+    manifest = IngestionManifest(str(tmp_path / 'other-manifest.json'))
+    collection.delete(ids=collection.get()['ids'])
+    stats = sync_folder(collection, manifest, str(folder), 'st', text_store=store)
+    assert stats['added'] == 2
+    assert sorted(collection.get()['documents']) == first_documents
+
+def test_embedding_cache_only_embeds_misses(tmp_path):
+    calls = []
+
+    def embedding_function(texts):
+        calls.append(list(texts))
+        return FakeEmbeddingFunction()(texts)
+
+    cache = EmbeddingCache(str(tmp_path), 'test/model')
+    first = cache.embed(['graph coverage', 'unit  testing', 'graph coverage'], embedding_function)
+    assert calls == [['graph coverage', 'unit testing']]
+    assert first[0].dtype == 'float32'
+
+    # Whitespace differences hit the same entry, also after reopening from disk
+    reopened = EmbeddingCache(str(tmp_path), 'test/model')
+    second = reopened.embed(['unit testing', 'graph  coverage'], embedding_function)
+    assert len(calls) == 1
+    assert (second[1] == first[0]).all()
+    assert reopened.stats == {'hits': 2, 'misses': 0}
+
+    # Vectors are scoped to the model they came from
+    EmbeddingCache(str(tmp_path), 'other/model').embed(['unit testing'], embedding_function)
+    assert len(calls) == 2
+
+def test_embedding_cache_instances_sharing_a_directory_keep_rows_apart(tmp_path):
+    embed = FakeEmbeddingFunction()
+    first = EmbeddingCache(str(tmp_path), 'test/model')
+    second = EmbeddingCache(str(tmp_path), 'test/model')
+    first.put_many(['x'], embed(['x']))
+    second.put_many(['y'], embed(['y']))
+
+    assert np.allclose(second.get_many(['y'])[0], embed(['y'])[0])
+    assert np.allclose(second.get_many(['x'])[0], embed(['x'])[0])
+    assert np.allclose(first.get_many(['y'])[0], embed(['y'])[0])
+    assert len(EmbeddingCache(str(tmp_path), 'test/model')) == 2
+
+    # A torn tail from a crashed writer is dropped before the next append
+    with open(os.path.join(first.directory, 'vectors.f32'), 'ab') as file:
+        file.write(b'\0' * 6)
+    first.put_many(['z'], embed(['z']))
+    assert np.allclose(second.get_many(['z'])[0], embed(['z'])[0])
+
+def test_sync_folder_reuses_cached_embeddings(collection, folder, tmp_path):
+    calls = []
+
+    def embedding_function(texts):
+        calls.append(len(texts))
+        return FakeEmbeddingFunction()(texts)
+
+    cache = EmbeddingCache(str(tmp_path / 'cache'), 'fake')
+    embed = lambda documents: cache.embed(documents, embedding_function)
+    sync_folder(collection, IngestionManifest(str(tmp_path / 'a.json')), str(folder), 'st', embed=embed)
+    embedded = sum(calls)
+    assert embedded == collection.count()
+
+    # Rebuilding into a fresh collection costs only cache lookups
+    other = chromadb.PersistentClient(path=str(tmp_path / 'other')).get_or_create_collection(
+        name='pdf_embeddings_v2', embedding_function=FakeEmbeddingFunction())
+    sync_folder(other, IngestionManifest(str(tmp_path / 'b.json')), str(folder), 'st', embed=embed)
+    assert sum(calls) == embedded
+    assert other.count() == collection.count()
+
+
+def test_create_embedding_engine_reads_config():
+    class Config:
+        EMBEDDING_BACKEND = 'onnx'
+        EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+        EMBEDDING_MODEL_PATH = ''
+        EMBEDDING_OFFLINE = False
+        EMBEDDING_BATCH_SIZE = 8
+        EMBEDDING_THREADS = 2
+        EMBEDDING_MAX_SEQ_LENGTH = 128
+
+    engine = create_embedding_engine(Config)
+    assert isinstance(engine, OnnxEmbeddingEngine)
+    assert (engine.batch_size, engine.threads) == (8, 2)
+    assert engine.model_id == 'onnx:all-MiniLM-L6-v2:128'
+
+    Config.EMBEDDING_BACKEND = 'gpu'
+    with pytest.raises(ValueError):
+        create_embedding_engine(Config)
+
+
+def test_bundled_model_path_never_downloads(tmp_path):
+    engine = DefaultEmbeddingEngine(model_dir=str(tmp_path / 'all-MiniLM-L6-v2'))
+    with pytest.raises(FileNotFoundError):
+        engine(["no network needed"])
+
+
+def test_warm_up_sets_ready_after_dummy_query(collection):
+    class BrokenEmbeddings:
+        def load(self):
+            raise OSError("model missing")
+
+    failed = WarmUp(collection, BrokenEmbeddings())
+    assert failed.run() is False
+    assert not failed.ready.is_set() and 'model missing' in failed.error
+
+    warm_up = WarmUp(collection, collection._embedding_function)
+    warm_up.start()
+    assert warm_up.ready.wait(10)
+    assert warm_up.to_dict()["ready"] and warm_up.to_dict()["error"] is None
+
+
+def test_open_collection_applies_hnsw_params_and_warns_on_mismatch(tmp_path, caplog):
+    metadata = {"hnsw:space": "cosine", "hnsw:M": 8, "hnsw:construction_ef": 64, "hnsw:search_ef": 40}
+    collection = open_collection(str(tmp_path), name='hnsw_test', metadata=metadata)
+    assert collection.metadata == metadata
+    assert 'rebuild' not in caplog.text
+
+    open_collection(str(tmp_path), name='hnsw_test', metadata=dict(metadata, **{"hnsw:M": 32}))
+    assert "{'hnsw:M': 8}" in caplog.text
+
+
+def test_pca_projection_keeps_neighbours_and_round_trips(tmp_path):
+    rng = np.random.default_rng(0)
+    # 64-dim vectors that really live in 8 dimensions
+    vectors = rng.normal(size=(300, 8)) @ rng.normal(size=(8, 64))
+    projection = fit_projection(vectors, 8, 'pca')
+    reduced = projection.transform(vectors)
+    assert reduced.shape == (300, 8)
+    full_order = np.argsort(np.linalg.norm(vectors - vectors[0], axis=1))[:10]
+    reduced_order = np.argsort(np.linalg.norm(reduced - reduced[0], axis=1))[:10]
+    assert full_order.tolist() == reduced_order.tolist()
+
+    path = str(tmp_path / 'pdf_embeddings.projection.npz')
+    projection.save(path)
+    loaded = Projection.load(path)
+    assert loaded.method == 'pca' and loaded.fingerprint == projection.fingerprint
+    assert fit_projection(vectors, 16, 'random').dim == 16
+    with pytest.raises(ValueError):
+        fit_projection(vectors, 128, 'pca')
+
+
+def test_ingest_fits_projection_used_for_storage_and_queries(folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest.RagConfig, 'PERSIST_DIRECTORY', str(tmp_path / 'vectordb'))
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_CACHE_DIR', '')
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_REDUCTION', 'pca')
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_REDUCED_DIM', 4)
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_REDUCTION_SAMPLE', 50)
+    monkeypatch.setattr(ingest, 'create_embedding_engine', lambda config: FakeEmbeddingFunction())
+    monkeypatch.setattr('rag.store.create_embedding_engine', lambda config: FakeEmbeddingFunction())
+    get_embedding_function.cache_clear()
+    try:
+        os.makedirs(tmp_path / 'vectordb')
+        ingest.prepare_projection([(str(folder), 'st')])
+        embedding_function = get_embedding_function()
+        assert isinstance(embedding_function, ProjectedEmbeddingFunction)
+        assert embedding_function.model_id.startswith('fake:pca4-')
+        assert len(embedding_function(['boundary value analysis'])[0]) == 4
+    finally:
+        get_embedding_function.cache_clear()
+
+
+def test_projection_is_not_applied_to_a_store_of_full_width_vectors(folder, tmp_path, monkeypatch):
+    persist_directory = str(tmp_path / 'vectordb')
+    monkeypatch.setattr(ingest.RagConfig, 'PERSIST_DIRECTORY', persist_directory)
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_CACHE_DIR', '')
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_REDUCED_DIM', 4)
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_REDUCTION_SAMPLE', 50)
+    monkeypatch.setattr(ingest, 'create_embedding_engine', lambda config: FakeEmbeddingFunction())
+    monkeypatch.setattr('rag.store.create_embedding_engine', lambda config: FakeEmbeddingFunction())
+    client = chromadb.PersistentClient(path=persist_directory)
+    client.create_collection(ingest.RagConfig.COLLECTION_NAME, embedding_function=FakeEmbeddingFunction()).add(
+        ids=['st_1'], documents=['unit testing'])
+    monkeypatch.setattr(ingest.RagConfig, 'EMBEDDING_REDUCTION', 'pca')
+    get_embedding_function.cache_clear()
+    try:
+        with pytest.raises(SystemExit, match='empty store'):
+            ingest.prepare_projection([(str(folder), 'st')])
+
+        # A projection fitted elsewhere doesn't change the width queries are embedded at
+        fit_projection(np.random.default_rng(0).normal(size=(50, 8)), 4, 'pca').save(
+            os.path.join(persist_directory, f'{ingest.RagConfig.COLLECTION_NAME}.projection.npz'))
+        assert isinstance(get_embedding_function(), FakeEmbeddingFunction)
+    finally:
+        get_embedding_function.cache_clear()
+
+
+def test_blue_green_rebuild_swaps_alias_after_smoke_test_and_collects_old_versions(folder, tmp_path, opener):
+    persist = str(tmp_path / 'vectordb')
+    shards = ShardRouter(persist, 'pdf_embeddings', prefixes=['st'], opener=opener)
+    legacy = shards.collection_for('st')
+    sync_folder(legacy, shards.manifest_for('st'), str(folder), 'st')
+    served = shards.search_collection()
+    chunk_count = served.count()
+    legacy_dirs = vector_segment_dirs(persist, legacy)
+    assert all(map(os.path.isdir, legacy_dirs))
+
+    result = blue_green_rebuild(shards, 'st', [(str(folder), 'st')], {}, smoke_queries=['testing'])
+    assert result["swapped"] and result["name"] == 'pdf_embeddings__v1'
+    assert shards.alias_for('st').resolve() == 'pdf_embeddings__v1' and shards.generation.value() == 1
+    assert served.count() == chunk_count and retrieve(served, 'testing', folder='st')['ids'][0]
+    assert os.path.exists(os.path.join(persist, 'pdf_embeddings__v1.manifest.json'))
+
+    assert blue_green_rebuild(shards, 'st', [(str(folder), 'st')], {})["removed"] == ['pdf_embeddings']
+    names = chromadb.PersistentClient(path=persist).list_collections()
+    assert sorted(names) == ['pdf_embeddings__v1', 'pdf_embeddings__v2']
+    # Collected versions take their HNSW index with them
+    assert not any(map(os.path.exists, legacy_dirs))
+
+    # An empty build fails the smoke test and leaves the live version alone
+    empty = tmp_path / 'empty'
+    empty.mkdir()
+    result = blue_green_rebuild(shards, 'st', [(str(empty), 'st')], {})
+    assert not result["swapped"] and shards.alias_for('st').resolve() == 'pdf_embeddings__v2'
+    assert 'pdf_embeddings__v3' not in chromadb.PersistentClient(path=persist).list_collections()
+
+    size = directory_size(persist)
+    assert collect_garbage(persist, shards.alias_for('st'), keep=1) == ['pdf_embeddings__v1']
+    assert directory_size(persist) < size
+
+
+def test_maintenance_removes_duplicates_and_orphans_then_compacts(folder, tmp_path, opener):
+    shards = ShardRouter(str(tmp_path / 'vectordb'), 'pdf_embeddings', prefixes=['st'], opener=opener)
+    collection, manifest = shards.collection_for('st'), shards.manifest_for('st')
+    sync_folder(collection, manifest, str(folder), 'st')
+    chunk_count = collection.count()
+    tracked = collection.get(limit=1, include=['documents', 'metadatas'])
+    source = tracked['metadatas'][0]['source']
+    # What the old startup ingestion left behind: uuid-keyed copies
+    collection.add(
+        ids=['st_copy-1', 'st_copy-2', 'st_copy-3', 'st_gone-1'],
+        documents=[tracked['documents'][0], 'whole lecture', 'whole  lecture', 'removed lecture'],
+        metadatas=[{'folder': 'st', 'source': source}, {'folder': 'st', 'source': source},
+                   {'folder': 'st', 'source': source}, {'folder': 'st', 'source': 'gone.pdf'}]
+    )
+
+    duplicates, orphans = find_redundant(collection, manifest, str(tmp_path))
+    # Untracked copies of a PDF the manifest tracks are superseded by its chunks
+    assert sorted(duplicates) == ['st_copy-1', 'st_copy-2', 'st_copy-3'] and orphans == ['st_gone-1']
+    delete_ids(collection, duplicates + orphans)
+    assert collection.count() == chunk_count
+
+    size = directory_size(str(tmp_path / 'vectordb'))
+    name, removed = compact_collection(shards, 'st', keep=1)
+    vacuum(str(tmp_path / 'vectordb'))
+    assert directory_size(str(tmp_path / 'vectordb')) < size
+    assert name == 'pdf_embeddings__v1' and removed == ['pdf_embeddings']
+    compacted = shards.collection_for('st')
+    assert compacted.name == name and compacted.count() == chunk_count
+    assert shards.manifest_for('st').keys('st') == manifest.keys('st')
+    assert find_redundant(compacted, shards.manifest_for('st'), str(tmp_path)) == ([], [])
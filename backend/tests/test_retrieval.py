@@ -0,0 +1,312 @@
+import threading
+import time
+
+import chromadb
+import numpy as np
+import pytest
+
+from rag.answer_cache import SemanticAnswerCache
+from rag.cache import QueryCache, TTLCache
+from rag.context import assemble_context, build_context, estimate_tokens, fetch_candidates, mmr
+from rag.documents import DocumentIndex, TwoStageCollection, rebuild_document_index
+from rag.exact_index import ExactCollection, ExactIndex, rebuild_exact_index
+from rag.generation import IndexGeneration
+from rag.lexical import BM25Index, LexicalIndex, reciprocal_rank_fusion, rebuild_lexical_index
+from rag.jobs import IngestJobQueue
+from rag.rerank import Reranker
+from rag.retrieval import course_folder, metadata_filter, retrieve
+from rag.shards import ShardRouter
+
+
+def test_course_folder_maps_chat_course_names():
+    assert course_folder('software%20testing') == 'st'
+    assert course_folder('Software-Engineering') == 'se'
+    assert course_folder('st') == 'st'
+    assert course_folder('data-science') is None
+    assert metadata_filter() is None
+    assert metadata_filter('st', week=3) == {"$and": [{"folder": "st"}, {"week": 3}]}
+
+
+def test_retrieve_filters_by_course_inside_the_index(collection):
+    collection.add(
+        ids=['st_1', 'se_1'],
+        documents=['boundary value analysis', 'boundary value analysis'],
+        metadatas=[{'folder': 'st'}, {'folder': 'se'}]
+    )
+    results = retrieve(collection, 'boundary value analysis', folder='se', n_results=2)
+    assert results['ids'] == [['se_1']]
+    assert len(retrieve(collection, 'boundary value analysis', n_results=2)['ids'][0]) == 2
+
+
+def test_mmr_skips_near_duplicates():
+    query = [1.0, 0.0, 0.0]
+    vectors = [[1.0, 0.1, 0.0], [1.0, 0.11, 0.0], [0.7, 0.0, 0.7]]
+    assert mmr(query, vectors, 2, lambda_mult=0.5) == [0, 2]
+    assert mmr(query, vectors, 2, lambda_mult=1.0) == [0, 1]
+
+
+def test_assemble_context_stays_within_token_budget():
+    chunks = [('a' * 400, {'source': 'x.pdf', 'page_start': 1, 'page_end': 2}),
+              ('b' * 4000, {'source': 'y.pdf', 'page_start': 3, 'page_end': 3}),
+              ('c' * 100, {'source': 'z.pdf'})]
+    text, used = assemble_context(chunks, token_budget=200)
+    assert estimate_tokens(text) <= 200
+    assert [metadata['source'] for _, metadata in used] == ['x.pdf', 'z.pdf']
+    assert text.startswith('[x.pdf, p. 1-2]')
+
+    text, used = assemble_context(chunks[1:], token_budget=50)
+    assert len(used) == 1 and estimate_tokens(text) <= 50
+
+
+def test_build_context_uses_course_chunks(collection):
+    collection.add(
+        ids=['st_1', 'st_2', 'se_1'],
+        documents=['unit testing basics', 'mutation testing', 'requirements'],
+        metadatas=[{'folder': 'st', 'source': 'a.pdf'}, {'folder': 'st', 'source': 'b.pdf'},
+                   {'folder': 'se', 'source': 'c.pdf'}]
+    )
+    text, used = build_context(collection, 'unit testing', collection._embedding_function,
+                               folder='st', candidates=5, token_budget=100)
+    assert sorted(metadata['source'] for _, metadata in used) == ['a.pdf', 'b.pdf']
+    assert 'requirements' not in text
+
+
+def test_ttl_cache_evicts_least_recent_and_expired(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('rag.cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1
+    now[0] += 11
+    assert cache.get('c') is None
+    assert cache.stats == {"hits": 2, "misses": 2, "evictions": 1}
+
+
+def test_query_cache_skips_search_until_generation_bumps(collection, tmp_path):
+    collection.add(ids=['st_1', 'st_2'], documents=['unit testing', 'mutation testing'],
+                   metadatas=[{'folder': 'st'}, {'folder': 'st'}])
+    generation = IndexGeneration(str(tmp_path / 'index.generation'))
+    cache = QueryCache(generation)
+    embedding_function = collection._embedding_function
+
+    first = fetch_candidates(collection, 'Unit  testing', embedding_function, 'st', 5, cache)
+    second = fetch_candidates(collection, 'unit testing', embedding_function, 'st', 5, cache)
+    assert second[1] == first[1]
+    assert cache.to_dict()['results']['hits'] == 1
+    assert cache.to_dict()['embeddings']['hits'] == 1
+
+    collection.delete(ids=['st_2'])
+    assert generation.bump() == 1
+    third = fetch_candidates(collection, 'unit testing', embedding_function, 'st', 5, cache)
+    assert third[1] == ['unit testing']
+    assert cache.to_dict()['invalidations'] == 1
+
+
+def test_bm25_ranks_exact_terms_and_round_trips(tmp_path):
+    index = BM25Index.build([
+        ('st_1', 'Cyclomatic complexity counts independent paths', {'folder': 'st'}),
+        ('st_2', 'Unit tests check small pieces of code', {'folder': 'st'}),
+        ('se_1', 'Track stories in Pivotal Tracker; complexity grows', {'folder': 'se'}),
+    ])
+    assert [record_id for record_id, _ in index.search('cyclomatic complexity')] == ['st_1', 'se_1']
+    assert [record_id for record_id, _ in index.search('complexity', folder='se')] == ['se_1']
+    assert index.search('complexity', folder='ds') == []
+
+    path = str(tmp_path / 'index.bm25.npz')
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search('pivotal tracker') == index.search('pivotal tracker')
+    assert reciprocal_rank_fusion([['a', 'b', 'c'], ['c', 'a']]) == ['a', 'c', 'b']
+
+
+def test_hybrid_candidates_include_keyword_matches(collection, tmp_path):
+    documents = ['cyclomatic complexity'] + [f'unrelated lecture {i}' for i in range(5)]
+    collection.add(ids=[f'st_{i}' for i in range(6)], documents=documents,
+                   metadatas=[{'folder': 'st'}] * 6)
+    generation = IndexGeneration(str(tmp_path / 'index.generation'))
+    path = str(tmp_path / 'index.bm25.npz')
+    lexical = LexicalIndex(path, generation)
+    assert lexical.search('cyclomatic') == []
+
+    rebuild_lexical_index(collection, path)
+    generation.bump()
+    _, documents, _, _ = fetch_candidates(collection, 'what is cyclomatic complexity', collection._embedding_function,
+                                          'st', 2, lexical=lexical)
+    assert len(documents) == 2 and 'cyclomatic complexity' in documents
+
+
+def test_reranker_scores_and_falls_back_on_budget_or_error():
+    release, started = threading.Event(), threading.Event()
+    calls = []
+
+    class Scorer:
+        def score(self, query, documents):
+            calls.append(query)
+            if query == 'slow':
+                release.wait(5)
+            if query == 'quick':
+                started.set()
+                time.sleep(0.05)
+            if query == 'broken':
+                raise RuntimeError('model missing')
+            return [float(len(document)) for document in documents]
+
+    reranker = Reranker(Scorer(), budget_ms=50)
+    assert list(reranker.scores('q', ['aa', 'a', 'aaa'])) == [2.0, 1.0, 3.0]
+    assert reranker.scores('slow', ['a']) is None
+    # While the overrunning call runs, requests fall back without queueing work
+    assert all(reranker.scores('q', ['a']) is None for _ in range(5))
+    release.set()
+    reranker._executor.submit(lambda: None).result(timeout=5)
+    assert calls == ['q', 'slow']
+    assert reranker.scores('broken', ['a']) is None
+    assert reranker.stats == {"reranked": 1, "timeouts": 1, "errors": 1, "busy": 5}
+
+    # A call that finishes within the budget makes a concurrent request wait, not fall back
+    reranker = Reranker(Scorer(), budget_ms=1000)
+    running = threading.Thread(target=reranker.scores, args=('quick', ['a']))
+    running.start()
+    assert started.wait(5)
+    assert list(reranker.scores('q', ['aa'])) == [2.0]
+    running.join()
+    assert reranker.stats == {"reranked": 2, "timeouts": 0, "errors": 0, "busy": 0}
+    # Reranker scores replace vector similarity as MMR relevance
+    assert mmr([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]], 1, relevance=[0.1, 5.0]) == [1]
+
+
+def test_shard_router_routes_course_queries_and_merges_across_shards(folder, tmp_path, opener):
+    shards = ShardRouter(str(tmp_path / 'shards'), 'pdf_embeddings', prefixes=['st', 'se'], sharded=True, opener=opener)
+    queue = IngestJobQueue(router=shards)
+    job = queue.submit(str(folder), 'st')
+    assert job.wait(timeout=60) and job.state == 'succeeded'
+    queue.shutdown()
+    shards.collection_for('se').add(ids=['se_00000000_0000000000000000_0'], documents=['requirements'],
+                                    metadatas=[{'folder': 'se'}])
+
+    st_count = shards.collection_for('st').count()
+    assert shards.collection_for('st').name == 'pdf_embeddings_st'
+    assert len(shards.manifest_for('st').keys('st')) == 2
+    searched = shards.search_collection()
+    assert searched.count() == st_count + 1
+
+    scoped = retrieve(searched, 'requirements', folder='se', n_results=5)
+    assert scoped['ids'] == [['se_00000000_0000000000000000_0']]
+    merged = retrieve(searched, 'requirements', n_results=st_count + 1)
+    assert len(merged['ids'][0]) == st_count + 1
+    assert merged['distances'][0] == sorted(merged['distances'][0])
+
+    ids = merged['ids'][0][:3]
+    assert sorted(searched.get(ids=ids, include=['documents'])['ids']) == sorted(ids)
+
+
+def test_semantic_answer_cache_matches_similar_questions_per_course(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('rag.answer_cache.time.monotonic', lambda: now[0])
+    generation = IndexGeneration(str(tmp_path / 'index.generation'))
+    cache = SemanticAnswerCache(threshold=0.95, ttl=60, max_entries=2, generation=generation)
+
+    cache.store('software testing', [1.0, 0.0, 0.0], 'BVA tests the edges', seconds=2.0)
+    assert cache.lookup('software testing', [0.99, 0.05, 0.0]) == 'BVA tests the edges'
+    assert cache.lookup('software testing', [0.5, 0.5, 0.0]) is None
+    assert cache.lookup('software engineering', [1.0, 0.0, 0.0]) is None
+    now[0] += 61
+    assert cache.lookup('software testing', [1.0, 0.0, 0.0]) is None
+
+    cache.store('st', [0.0, 1.0, 0.0], 'a')
+    cache.store('st', [0.0, 0.0, 1.0], 'b')
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    generation.bump()
+    assert cache.lookup('st', [0.0, 1.0, 0.0]) is None and len(cache) == 0
+
+    stats = cache.to_dict()
+    assert (stats["hits"], stats["misses"], stats["seconds_saved"]) == (1, 4, 2.0)
+
+
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+def test_exact_index_matches_float32_top_k_and_round_trips(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 32)).astype(np.float32)
+    folders = ['st' if i % 2 else 'se' for i in range(500)]
+    index = ExactIndex.build([str(i) for i in range(500)], folders, vectors, dtype)
+    index.block_rows = 64
+    query = vectors[7] + 0.01 * rng.normal(size=32)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    truth = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:10]
+    rows, similarities = index.search(query, 10)
+    assert rows[0] == 7 and len(set(rows.tolist()) & set(truth.tolist())) >= 9
+    assert list(similarities) == sorted(similarities, reverse=True)
+
+    path = str(tmp_path / 'index.exact.bin')
+    index.save(path)
+    loaded = ExactIndex.load(path)
+    assert isinstance(loaded.vectors, np.memmap) and loaded.vectors.dtype == np.dtype(dtype)
+    assert loaded.search(query, 10)[0].tolist() == rows.tolist()
+    assert all(folders[row] == 'se' for row in loaded.search(query, 10, folder='se')[0])
+
+
+def test_exact_collection_serves_fetch_candidates(collection, tmp_path):
+    collection.add(ids=['st_1', 'st_2', 'se_1'], documents=['unit testing', 'mutation testing', 'requirements'],
+                   metadatas=[{'folder': 'st'}, {'folder': 'st'}, {'folder': 'se'}])
+    generation = IndexGeneration(str(tmp_path / 'index.generation'))
+    path = str(tmp_path / 'pdf_embeddings.exact.bin')
+    exact = ExactCollection(collection, path, generation)
+    # Without an index file queries fall through to Chroma
+    assert exact.query(query_texts=['requirements'], n_results=1)['ids'] == [['se_1']]
+
+    rebuild_exact_index(collection, path)
+    generation.bump()
+    results = retrieve(exact, 'requirements', folder='se', n_results=3)
+    assert results['ids'] == [['se_1']] and results['documents'] == [['requirements']]
+    assert results['distances'][0][0] == pytest.approx(0.0, abs=1e-3)
+    _, documents, metadatas, _ = fetch_candidates(exact, 'unit testing', collection._embedding_function, 'st', 5)
+    assert sorted(documents) == ['mutation testing', 'unit testing']
+    assert {metadata['folder'] for metadata in metadatas} == {'st'}
+
+
+def test_document_index_searches_only_the_closest_documents(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(4, 16))
+    metadatas = [{'folder': 'st' if d < 2 else 'se', 'source': f'week{d}.pdf'} for d in range(4) for _ in range(10)]
+    embeddings = np.repeat(centers, 10, axis=0) + 0.1 * rng.normal(size=(40, 16))
+    ids = [f'chunk_{i}' for i in range(40)]
+    index = DocumentIndex.build(ids, metadatas, embeddings)
+    index.top_documents = 1
+    assert index.sources == ['week2.pdf', 'week3.pdf', 'week0.pdf', 'week1.pdf']
+    assert list(index.offsets) == [0, 10, 20, 30, 40]
+
+    rows, _ = index.search(centers[3], 15)
+    assert len(rows) == 10 and {index.ids[row] for row in rows} == set(ids[30:40])
+    rows, _ = index.search(centers[3], 5, folder='st')
+    assert all(int(index.ids[row].split('_')[1]) < 20 for row in rows)
+
+    path = str(tmp_path / 'pdf_embeddings.documents.npz')
+    index.save(path)
+    loaded = DocumentIndex.load(path, top_documents=2)
+    assert loaded.sources == index.sources and len(loaded.search(centers[0], 30)[0]) == 20
+
+
+def test_two_stage_collection_serves_retrieve(collection, tmp_path):
+    collection.add(ids=['st_1', 'st_2', 'se_1'], documents=['unit testing', 'mutation testing', 'requirements'],
+                   metadatas=[{'folder': 'st', 'source': 'a.pdf'}, {'folder': 'st', 'source': 'b.pdf'},
+                              {'folder': 'se', 'source': 'c.pdf'}])
+    generation = IndexGeneration(str(tmp_path / 'index.generation'))
+    path = str(tmp_path / 'pdf_embeddings.documents.npz')
+    rebuild_document_index(collection, path)
+    two_stage = TwoStageCollection(collection, path, generation, top_documents=1)
+
+    results = retrieve(two_stage, 'mutation testing', folder='st', n_results=5)
+    assert results['ids'] == [['st_2']] and results['metadatas'][0][0]['source'] == 'b.pdf'
+
+
+def test_shard_router_ignores_the_unsharded_collection_when_discovering_courses(tmp_path):
+    persist = str(tmp_path / 'vectordb')
+    client = chromadb.PersistentClient(path=persist)
+    for name in ['pdf_embeddings__v1', 'pdf_embeddings_st__v2', 'pdf_embeddings_se']:
+        client.create_collection(name, embedding_function=None)
+
+    shards = ShardRouter(persist, 'pdf_embeddings', sharded=True)
+    assert shards.prefixes() == ['se', 'st']